@@ -1,96 +1,168 @@
 import streamlit as st
-import pandas as pd
 import hashlib
-import io
-import xlsxwriter
 import base64
+import importlib
+import io
+import os
+import threading
 import time
 from datetime import datetime, date
-from streamlit_gsheets import GSheetsConnection
+from functools import partial
+import perf
+from sesi import LocalRevocations, make_token, read_token
 
 # --- 1. KONFIGURASI HALAMAN ---
+# PERBAIKAN: Ikon material, bukan emoji -> streamlit tidak memuat katalog emoji (~0.1-0.3 dtk) di rerun pertama
 st.set_page_config(page_title="LKPKT Ombudsman", layout="wide", page_icon="📝")
+perf.start_rerun(st.session_state, st.session_state.get('username', '')); perf.mark("startup")
 
 # --- SLOT WAKTU OTOMATIS ---
 TIME_SLOTS = [
     "08.00 - 10.00", "10.00 - 12.00", "13.00 - 15.00", "15.00 - 17.00"
 ]
 
+# --- PILIHAN JUMLAH BARIS PER HALAMAN LAPORAN ([laporan] page_size di secrets.toml) ---
+PAGE_SIZES = [10, 25, 50, 100]
+
 # --- 2. KONEKSI GOOGLE SHEETS ---
 def get_conn():
-    return st.connection("gsheets", type=GSheetsConnection)
+    # Dibungkus proxy perf: jumlah request, waktu & ukuran data per rerun ikut tercatat
+    # PERBAIKAN: Import lazy (gspread + google-auth ~0.4 dtk) -> backend sqlite tidak pernah memuatnya
+    from streamlit_gsheets import GSheetsConnection
+    return perf.InstrumentedConn(st.connection("gsheets", type=GSheetsConnection), open_spreadsheet)
+
+def open_spreadsheet():
+    # Spreadsheet gspread lewat API publik (open_by_url / open), kredensial service account yang sama dengan
+    # [connections.gsheets]. Koneksi publik tanpa service account gagal di sini -> storage memakai conn.read/update
+    import gspread
+    cfg = dict(st.secrets["connections"]["gsheets"])
+    book = cfg.pop("spreadsheet"); cfg.pop("worksheet", None)
+    client = gspread.service_account_from_dict(cfg)
+    return client.open_by_url(book) if str(book).startswith("http") else client.open(book)
+
+def get_config(section):
+    # Baca bagian konfigurasi dari .streamlit/secrets.toml (kosong jika tidak ada)
+    try: return dict(st.secrets.get(section, {}))
+    except Exception: return {}
+
+# [debug] perf_panel = true -> panel performa di sidebar; perf_log = true -> log JSON per rerun
+DEBUG = get_config("debug")
+if DEBUG.get("perf_log", False): perf.enable_log()
+
+@st.cache_resource
+def get_storage():
+    # Backend dipilih lewat [storage] backend = "gsheets" | "sqlite" di secrets.toml
+    from storage import make_storage
+    return make_storage(get_config("storage"), get_conn)
 
 # --- 3. HELPER FUNCTIONS ---
 def make_hashes(password):
     return hashlib.sha256(str.encode(password)).hexdigest()
 
-def format_indo(tgl_str):
-    try:
-        if isinstance(tgl_str, str): tgl_obj = datetime.strptime(tgl_str, '%Y-%m-%d').date()
-        else: tgl_obj = tgl_str
-        hari = {'Monday': 'Senin', 'Tuesday': 'Selasa', 'Wednesday': 'Rabu', 'Thursday': 'Kamis', 'Friday': 'Jumat', 'Saturday': 'Sabtu', 'Sunday': 'Minggu'}
-        bulan = {1: 'Januari', 2: 'Februari', 3: 'Maret', 4: 'April', 5: 'Mei', 6: 'Juni', 7: 'Juli', 8: 'Agustus', 9: 'September', 10: 'Oktober', 11: 'November', 12: 'Desember'}
-        return f"{hari[tgl_obj.strftime('%A')]}, {tgl_obj.day} {bulan[tgl_obj.month]} {tgl_obj.year}"
-    except: return str(tgl_str)
-
-def reverse_format_indo(tgl_indo):
-    try:
-        parts = tgl_indo.replace(',', '').split()
-        if len(parts) == 4: parts = parts[1:] 
-        bulan_dict = {'Januari': 1, 'Februari': 2, 'Maret': 3, 'April': 4, 'Mei': 5, 'Juni': 6, 'Juli': 7, 'Agustus': 8, 'September': 9, 'Oktober': 10, 'November': 11, 'Desember': 12}
-        day = int(parts[0])
-        month = bulan_dict[parts[1]]
-        year = int(parts[2])
-        return date(year, month, day).strftime('%Y-%m-%d')
-    except:
-        return tgl_indo 
-
-def get_img_as_base64(file):
-    try:
-        with open(file, "rb") as f:
-            data = f.read()
-        return base64.b64encode(data).decode()
-    except FileNotFoundError:
-        return ""
-
-def generate_excel(df):
-    output = io.BytesIO()
-    workbook = xlsxwriter.Workbook(output, {'in_memory': True})
-    worksheet = workbook.add_worksheet('Laporan')
-    header_fmt = workbook.add_format({'bold': True, 'bg_color': '#9bc2e6', 'border': 1, 'align': 'center', 'valign': 'vcenter'})
-    body_fmt = workbook.add_format({'text_wrap': True, 'border': 1, 'valign': 'top', 'align': 'left'})
-    center_fmt = workbook.add_format({'text_wrap': True, 'border': 1, 'valign': 'top', 'align': 'center'})
-    date_merge_fmt = workbook.add_format({'text_wrap': True, 'border': 1, 'valign': 'vcenter', 'align': 'center'})
-
-    headers = ['ID', 'Tanggal', 'Waktu', 'Uraian Kegiatan', 'Hasil']
-    for col, h in enumerate(headers): worksheet.write(0, col, h, header_fmt)
-
-    grouped = df.groupby('Tanggal', sort=False)
-    curr_row = 1
-    for date_val, group in grouped:
-        rows = len(group)
-        if rows > 1: worksheet.merge_range(curr_row, 1, curr_row+rows-1, 1, str(date_val), date_merge_fmt)
-        else: worksheet.write(curr_row, 1, str(date_val), center_fmt)
-        
-        for _, r in group.iterrows():
-            worksheet.write(curr_row, 0, r['ID'], center_fmt)
-            worksheet.write(curr_row, 2, r['Waktu'], center_fmt)
-            worksheet.write(curr_row, 3, r['Uraian'], body_fmt)
-            worksheet.write(curr_row, 4, r['Hasil'], body_fmt)
-            curr_row += 1
-
-    worksheet.set_column('A:A', 5); worksheet.set_column('B:B', 25); worksheet.set_column('C:C', 15)
-    worksheet.set_column('D:D', 50); worksheet.set_column('E:E', 30)
-    workbook.close()
-    return output.getvalue()
+# --- SESI LINTAS WORKER ([session] secret = "...", ttl_minutes = 30; secret sama di semua worker) ---
+# Token harus tetap di URL (?s=): hanya itu yang dibawa browser saat reconnect diarahkan ke worker lain.
+# Konsekuensinya URL = bearer token (bisa bocor lewat riwayat browser, log proxy, tangkapan layar), jadi umurnya
+# dibuat pendek dan token dirotasi: setiap kali dipakai untuk memulihkan sesi, dan saat umurnya tinggal separuh
+# selama user aktif. Token lama langsung dicabut, sehingga URL yang bocor hanya berlaku sampai pemiliknya aktif lagi.
+# Harganya: tab kedua yang membuka salinan URL yang sama akan "mengambil alih" token, dan tab pertama harus login
+# ulang saat reconnect. Tanpa bus bersama, pencabutan hanya berlaku di worker yang sama (lihat sesi.py).
+SESSION = get_config("session")
+SESSION_TTL = float(SESSION.get("ttl_minutes", float(SESSION.get("ttl_hours", 0.5)) * 60)) * 60
+
+def issue_session(username):
+    if SESSION.get("secret"): st.query_params["s"] = make_token(username, SESSION["secret"], SESSION_TTL)
+
+@st.cache_resource
+def local_revocations():
+    return LocalRevocations()
+
+def revocations():
+    # PERBAIKAN: token yang dicabut saat logout dicatat di SharedBus (berlaku di semua worker); tanpa bus
+    # dicatat di proses ini -> logout tetap mencabut token (deploy multi-worker wajib memakai shared_path)
+    bus = get_storage().bus
+    return bus if bus is not None else local_revocations()
+
+def resume_session():
+    # Reconnect yang diarahkan ke worker lain: login dipulihkan dari token bertanda tangan di URL
+    token = st.query_params.get("s")
+    if not SESSION.get("secret") or not token: return
+    info = read_token(token, SESSION["secret"])
+    if info is None or revocations().is_revoked(info[1]) or get_storage().password_hash(info[0]) is None:
+        del st.query_params["s"]; return
+    st.session_state['logged_in'] = True; st.session_state['username'] = info[0]
+    rotate_session(info)
+
+def rotate_session(info):
+    # Token lama dicabut, token baru (umur penuh) dipasang di URL
+    revocations().revoke(info[1], info[2]); issue_session(info[0])
+
+def refresh_session():
+    # User aktif: token diperbarui saat umurnya tinggal separuh, jadi TTL pendek tidak memutus sesi yang sedang dipakai
+    info = read_token(st.query_params.get("s"), SESSION["secret"]) if SESSION.get("secret") else None
+    if info is not None and info[0] == st.session_state['username'] and info[2] - time.time() < SESSION_TTL / 2: rotate_session(info)
+
+def end_session():
+    info = read_token(st.query_params.get("s"), SESSION.get("secret", "")) if SESSION.get("secret") else None
+    if info is not None: revocations().revoke(info[1], info[2])
+    if "s" in st.query_params: del st.query_params["s"]
+    st.session_state['logged_in'] = False; st.session_state['username'] = ''
 
 # --- 4. LOAD ASSETS ---
-bg_web = get_img_as_base64("BYD.jpg") 
-bg_sidebar = get_img_as_base64("sidebar_bg.webp")
-icon_ombudsman = get_img_as_base64("ombudsman logo.png") # Asset Logo Ombudsman
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+ASSETS = {
+    # nama file hasil di static/ : (file sumber, lebar maksimum px, format)
+    "bg.jpg": ("BYD.jpg", 1600, "JPEG"),
+    "sidebar_bg.webp": ("sidebar_bg.webp", 800, "WEBP"),
+    "logo.png": ("ombudsman logo.png", 200, "PNG"),
+}
+MIME = {"JPEG": "image/jpeg", "WEBP": "image/webp", "PNG": "image/png"}
+
+def _encode_asset(src, max_width, fmt):
+    # Kecilkan & kompres ulang gambar (background 160 KB -> jauh lebih kecil di HP)
+    from PIL import Image
+    with Image.open(src) as img:
+        if img.width > max_width: img = img.resize((max_width, round(img.height * max_width / img.width)), Image.LANCZOS)
+        if fmt == "JPEG": img = img.convert("RGB")
+        buf = io.BytesIO()
+        img.save(buf, fmt, optimize=True, **({"quality": 80} if fmt != "PNG" else {}))
+    return buf.getvalue()
+
+@st.cache_resource
+def load_assets():
+    # PERBAIKAN: Diproses sekali per proses. Dengan server.enableStaticServing gambar disajikan sebagai
+    # file statis (app/static/...) yang di-cache browser; tanpa itu fallback ke data URI yang di-encode sekali.
+    static = st.get_option("server.enableStaticServing")
+    static_dir = os.path.join(APP_DIR, "static")
+    urls = {}
+    for name, (src, max_width, fmt) in ASSETS.items():
+        src = os.path.join(APP_DIR, src)
+        if not os.path.exists(src): urls[name] = ""; continue
+        try:
+            # PERBAIKAN: Hasil kompresi juga dipakai ulang untuk data URI -> proses baru tidak resize ulang (PIL ~0.2 dtk)
+            out = os.path.join(static_dir, name)
+            if not os.path.exists(out) or os.path.getmtime(out) < os.path.getmtime(src):
+                data = _encode_asset(src, max_width, fmt)
+                try:
+                    os.makedirs(static_dir, exist_ok=True)
+                    with open(out, "wb") as f: f.write(data)
+                except OSError:
+                    if static: raise
+            else:
+                with open(out, "rb") as f: data = f.read()
+            if static: urls[name] = f"app/static/{name}?v={int(os.path.getmtime(out))}"
+            else: urls[name] = f"data:{MIME[fmt]};base64,{base64.b64encode(data).decode()}"
+        except Exception:
+            urls[name] = ""
+    return urls
+
+def css_url(url):
+    return f'url("{url}")' if url else "none"
 
 # --- CSS CUSTOM STYLE ---
-st.markdown(f"""
+@st.cache_resource
+def get_css():
+    assets = load_assets()
+    return f"""
     <style>
     [data-testid="stHeader"] {{
         background-color: rgba(0,0,0,0);
@@ -98,7 +170,7 @@ st.markdown(f"""
     }}
     
     .stApp {{
-        background-image: url("data:image/jpeg;base64,{bg_web}");
+        background-image: {css_url(assets['bg.jpg'])};
         background-size: cover; 
         background-position: center center;
         background-repeat: no-repeat;
@@ -111,7 +183,7 @@ st.markdown(f"""
     [data-testid="stSidebar"]::before {{
         content: ""; position: absolute; top: 50%; left: 50%;
         width: 100vh; height: 100vh;
-        background-image: url("data:image/webp;base64,{bg_sidebar}");
+        background-image: {css_url(assets['sidebar_bg.webp'])};
         background-size: contain; background-position: center; background-repeat: no-repeat;
         transform: translate(-50%, -50%) rotate(-90deg);
         z-index: -1; opacity: 0.2;
@@ -202,7 +274,9 @@ st.markdown(f"""
         text-decoration: underline; 
     }}
     </style>
-    """, unsafe_allow_html=True)
+    """
+
+st.markdown(get_css(), unsafe_allow_html=True)
 
 # --- INJECT HTML FOOTER ---
 st.markdown("""
@@ -217,117 +291,207 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 
-# --- 5. DATABASE OPERATIONS DENGAN PEMBERSIH CACHE ---
+# --- 5. DATABASE OPERATIONS (CACHE PROSES DITAMBAL SAAT MENULIS) ---
+@perf.timed
 def load_logs():
-    conn = get_conn()
-    try: return conn.read(worksheet="logs", ttl=0)
-    except: return pd.DataFrame(columns=["user", "tanggal", "waktu", "aktivitas", "hasil", "id"])
+    from storage import empty_logs
+    try: return get_storage().load_logs()
+    except: return empty_logs()
 
-def load_users():
-    conn = get_conn()
-    max_retries = 3 # Sistem akan mencoba 3 kali jika gagal
-    
+def with_retry(fn, *args, max_retries=3):
+    # Sistem akan mencoba 3 kali jika gagal (mengatasi cold start koneksi)
     for i in range(max_retries):
-        try:
-            df = conn.read(worksheet="users", ttl=0)
-            if 'username' not in df.columns or 'password' not in df.columns: 
-                return pd.DataFrame(columns=["username", "password"])
-            return df
-        except Exception as e:
-            if i < max_retries - 1:
-                time.sleep(2) # Tunggu 2 detik lalu coba lagi (mengatasi cold start)
-            else:
-                st.error(f"💥 DETAIL ERROR DATABASE: {e}")
-                return pd.DataFrame(columns=["username", "password"])
+        try: return fn(*args)
+        except Exception:
+            if i == max_retries - 1: raise
+            time.sleep(2) # Tunggu 2 detik lalu coba lagi
+
+@perf.timed
+def check_login(username, password):
+    # PERBAIKAN: Lookup O(1) di index username -> hash (cache proses); sheet users hanya dibaca ulang
+    # jika username belum dikenal. Hasil: None = user tidak ada, True/False = password cocok/tidak
+    siapkan_app()
+    stored_pass = with_retry(get_storage().password_hash, username)
+    if stored_pass is None: return None
+    return stored_pass == make_hashes(password)
+
+@perf.timed
+def add_data_batch(user, rows):
+    # PERBAIKAN: Semua baris baru dikirim dalam 1 batch append, id dialokasikan sebagai 1 blok
+    if not rows: return 0
+    get_storage().append_logs(user, rows)
+    return len(rows)
 
 def add_data(user, tanggal, waktu, aktivitas, hasil):
-    conn = get_conn(); df_logs = load_logs()
-    new_id = 1
-    if not df_logs.empty and 'id' in df_logs.columns:
-        df_logs['id'] = pd.to_numeric(df_logs['id'], errors='coerce').fillna(0)
-        if len(df_logs) > 0: new_id = int(df_logs['id'].max()) + 1
-    new_row = pd.DataFrame([{"user": user, "tanggal": str(tanggal), "waktu": waktu, "aktivitas": aktivitas, "hasil": hasil, "id": new_id}])
-    conn.update(worksheet="logs", data=pd.concat([df_logs, new_row], ignore_index=True))
-    st.cache_data.clear() # PERBAIKAN: Hapus cache memori
+    return add_data_batch(user, [{"tanggal": tanggal, "waktu": waktu, "aktivitas": aktivitas, "hasil": hasil}])
 
+@perf.timed
 def create_user(username, password):
-    df_users = load_users()
-    if df_users.empty: pass 
-    elif username in df_users['username'].values: return False
-    conn = get_conn()
-    new_row = pd.DataFrame([{"username": username, "password": password}])
-    conn.update(worksheet="users", data=pd.concat([df_users, new_row], ignore_index=True))
-    st.cache_data.clear() # PERBAIKAN: Hapus cache memori agar login langsung bisa
-    return True
-
-def delete_data(log_id):
-    conn = get_conn(); df_logs = load_logs()
-    df_logs['id'] = pd.to_numeric(df_logs['id'], errors='coerce')
-    conn.update(worksheet="logs", data=df_logs[df_logs['id'] != log_id])
-    st.cache_data.clear() # PERBAIKAN: Hapus cache memori
-
-def update_data_log(log_id, tanggal, waktu, aktivitas, hasil):
-    conn = get_conn(); df_logs = load_logs()
-    df_logs['id'] = pd.to_numeric(df_logs['id'], errors='coerce')
-    idx = df_logs.index[df_logs['id'] == log_id].tolist()
-    if idx:
-        df_logs.at[idx[0], 'tanggal'] = str(tanggal); df_logs.at[idx[0], 'waktu'] = waktu
-        df_logs.at[idx[0], 'aktivitas'] = aktivitas; df_logs.at[idx[0], 'hasil'] = hasil
-        conn.update(worksheet="logs", data=df_logs)
-        st.cache_data.clear() # PERBAIKAN: Hapus cache memori
+    try:
+        siapkan_app()
+        return get_storage().create_user(username, password)
+    except Exception: return False
+
+KONFLIK_MSG = "⚠️ Data ini sudah diubah/dihapus di sesi lain. Tampilan dimuat ulang, silakan cek lagi."
+
+@perf.timed
+def delete_data(log_id, rev=None):
+    # PERBAIKAN: rev = versi baris saat ditampilkan; perubahan dari sesi lain tidak ditimpa diam-diam
+    from storage import ConflictError
+    try: get_storage().delete_log(log_id, rev=rev); return True
+    except ConflictError: st.toast(KONFLIK_MSG); return False
+
+@perf.timed
+def update_data_log(log_id, tanggal, waktu, aktivitas, hasil, rev=None):
+    from storage import ConflictError
+    try: get_storage().update_log(log_id, tanggal, waktu, aktivitas, hasil, rev=rev); return True
+    except ConflictError: st.toast(KONFLIK_MSG); return False
+
+@perf.timed
+def get_filtered_df(user, start_date, end_date, cari=''):
+    # PERBAIKAN: Filter user + tanggal dijalankan di storage (SQL ber-index / subset per user).
+    # cari = kata kunci uraian/hasil, dicocokkan lewat index teks (FTS5 / inverted index di cache)
+    from storage import empty_logs
+    try: df = get_storage().search_logs(user, start_date, end_date, cari) if cari.strip() else get_storage().query_logs(user, start_date, end_date)
+    except: df = empty_logs()
+    return df[['id', 'tanggal', 'waktu', 'aktivitas', 'hasil', 'rev']].set_axis(['ID','Tanggal','Waktu','Uraian','Hasil','Rev'], axis=1).reset_index(drop=True)
 
 def get_filtered_logs(user, start_date, end_date):
-    df = load_logs()
-    if df.empty: return []
-    df = df[df['user'] == user]
-    df['tanggal_dt'] = pd.to_datetime(df['tanggal']).dt.date
-    mask = (df['tanggal_dt'] >= start_date) & (df['tanggal_dt'] <= end_date)
-    df_filtered = df.loc[mask].sort_values(by=['tanggal', 'waktu'], ascending=[False, True])
-    return df_filtered[['id', 'tanggal', 'waktu', 'aktivitas', 'hasil']].values.tolist()
-
-def count_activity_per_day(user, tanggal):
-    df = load_logs(); 
-    if df.empty: return 0
-    df = df[df['user'] == user]; df['tanggal'] = df['tanggal'].astype(str)
-    return len(df[df['tanggal'] == str(tanggal)])
-
+    return get_filtered_df(user, start_date, end_date).drop(columns='Rev').values.tolist()
+
+@perf.timed
+def slot_terisi(user, tanggal):
+    # PERBAIKAN: Bitmap slot terisi (bit i = TIME_SLOTS[i]) dari index (user, tanggal) yang ikut
+    # ditambal saat tambah/edit/hapus/restore -> O(1), tanpa scan tabel
+    try: return get_storage().slot_mask(user, tanggal, TIME_SLOTS)
+    except: return 0
+
+def slot_kosong(user, tanggal):
+    mask = slot_terisi(user, tanggal)
+    return [s for i, s in enumerate(TIME_SLOTS) if not mask >> i & 1]
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def _excel_laporan_cached(user, start_date, end_date, version):
+    from laporan import generate_excel, iter_excel_rows
+    return generate_excel(iter_excel_rows(get_storage().query_logs(user, start_date, end_date)))
+
+@perf.timed
+def excel_laporan(user, start_date, end_date):
+    # Dipanggil saat tombol download diklik; cache per (user, rentang, versi data)
+    from laporan import generate_excel, iter_excel_rows
+    version = get_storage().version
+    if version is None: return generate_excel(iter_excel_rows(get_storage().query_logs(user, start_date, end_date)))
+    return _excel_laporan_cached(user, start_date, end_date, version)
+
+@perf.timed
 def restore_data(user, df_uploaded):
-    conn = get_conn()
-    df_logs = load_logs()
-    success_count = 0
-    for _, row in df_uploaded.iterrows():
-        try:
-            tgl_indo = row['Tanggal']; waktu = row['Waktu']; aktivitas = row['Uraian Kegiatan']; hasil = row['Hasil']
-            if pd.isna(waktu) or pd.isna(aktivitas): continue 
-            tgl_db = reverse_format_indo(str(tgl_indo))
-            
-            new_id = 1
-            if not df_logs.empty and 'id' in df_logs.columns:
-                df_logs['id'] = pd.to_numeric(df_logs['id'], errors='coerce').fillna(0)
-                if len(df_logs) > 0: new_id = int(df_logs['id'].max()) + 1
-                
-            new_row = pd.DataFrame([{"user": user, "tanggal": tgl_db, "waktu": waktu, "aktivitas": aktivitas, "hasil": hasil, "id": new_id}])
-            df_logs = pd.concat([df_logs, new_row], ignore_index=True)
-            success_count += 1
-        except Exception as e:
-            pass 
-            
-    if success_count > 0:
-        conn.update(worksheet="logs", data=df_logs)
-        st.cache_data.clear() # PERBAIKAN: Hapus cache memori
-        return success_count
-    return 0
+    # PERBAIKAN: Validasi & parsing tanggal sekali jalan (vektor), id dialokasikan 1 blok, tulis 1 kali
+    from laporan import prepare_restore
+    rows, rejected = prepare_restore(df_uploaded)
+    if not rows.empty: get_storage().append_logs(user, rows.to_dict('records'))
+    return len(rows), rejected
+
+@perf.timed
+def backup_snapshot(user):
+    # Dipanggil saat tombol download diklik. user None = seluruh database (khusus supervisor)
+    # PERBAIKAN: baca storage langsung (bukan load_logs() yang menelan error -> file backup kosong);
+    # gagal baca setelah dicoba ulang -> exception, tombol download menampilkan error
+    from laporan import export_snapshot
+    from storage import normalize_logs
+    df = normalize_logs(with_retry(get_storage().load_logs) if user is None else with_retry(get_storage().user_logs, user))
+    return export_snapshot(df, user or 'semua')
+
+@perf.timed
+def restore_snapshot(user, source):
+    # PERBAIKAN: Restore berdasar ID asli -> file yang sama di-upload berulang tidak menggandakan data
+    import pandas as pd
+    from laporan import load_snapshot
+    rows, rejected = load_snapshot(source)
+    if not is_supervisor(user):  # staf hanya boleh merestore log miliknya sendiri
+        lain = rows['user'] != user
+        rejected = pd.concat([rejected, rows[lain].assign(Alasan='Milik user lain')]); rows = rows[~lain]
+    masuk = get_storage().restore_logs(rows) if not rows.empty else 0
+    return masuk, len(rows) - masuk, rejected
+
+# --- REKAP SUPERVISOR ([laporan] supervisors = ["nama", ...] di secrets.toml) ---
+def is_supervisor(username):
+    return username in get_config("laporan").get("supervisors", [])
+
+@st.cache_data(max_entries=240, show_spinner=False)
+def _rekap_bulan_cached(lo, hi, sidik, _df):
+    # Rekap harian satu bulan yang sudah tutup. sidik = (jumlah, total id, total rev) bulan itu, hanya berubah
+    # jika data lama diedit -> bulan yang sudah lewat praktis dihitung sekali. _df tidak ikut di-hash.
+    from laporan import rekap_harian
+    return rekap_harian(_df, TIME_SLOTS)
+
+@perf.timed
+def rekap_harian_semua(start_date, end_date):
+    # PERBAIKAN: Semua user dalam satu pass vektor; hanya bulan berjalan yang selalu dihitung ulang
+    import pandas as pd
+    from laporan import rekap_harian
+    df = load_logs()
+    df = df[(df['tanggal'].astype(str) >= str(start_date)) & (df['tanggal'].astype(str) <= str(end_date))]
+    if df.empty: return rekap_harian(df, TIME_SLOTS), df
+    bulan = df['tanggal'].astype(str).str[:7]
+    bulan_ini = date.today().strftime('%Y-%m'); parts = []
+    for b, g in df.groupby(bulan, sort=True):
+        if b < bulan_ini:
+            lo, hi = max(str(start_date), f"{b}-01"), min(str(end_date), f"{b}-31")
+            parts.append(_rekap_bulan_cached(lo, hi, (len(g), int(g['id'].sum()), int(g['rev'].sum())), g))
+        else: parts.append(rekap_harian(g, TIME_SLOTS))
+    return pd.concat(parts, ignore_index=True), df
+
+def daftar_user():
+    try: return sorted(get_storage().load_users()['username'].dropna().astype(str).unique())
+    except Exception: return []
+
+@perf.timed
+def excel_rekap(start_date, end_date, users):
+    # Dipanggil saat tombol download diklik: ringkasan + 3 jenis periode + detail log per staf, 1 file
+    from laporan import generate_rekap_excel, rekap_periode, rekap_ringkasan, REKAP_FREQ
+    harian, df = rekap_harian_semua(start_date, end_date)
+    users = list(users); harian = harian[harian['user'].isin(users)]
+    per_periode = {nama: rekap_periode(harian, nama, start_date, end_date, users, len(TIME_SLOTS)) for nama in REKAP_FREQ}
+    ringkasan = rekap_ringkasan(per_periode['Bulanan'], len(TIME_SLOTS))
+    detail = dict(tuple(df[df['user'].isin(users)].groupby('user', sort=True)))
+    return generate_rekap_excel(ringkasan, per_periode, {u: detail[u] for u in users if u in detail})
 
 def seed_users_gsheet():
-    df_users = load_users()
-    if df_users is None or (df_users.empty and "username" not in df_users.columns): return
-    if df_users.empty or len(df_users) == 0:
-        default_users = ["Elisa Luhulima", "Ahmad Sobirin", "Dewi Puspita Sari", "Anni Samudra Wulan", "Nafi Alrasyid", "Muhamad Ichsan Kamil", "Oscar Gideon", "Rafael Yolens Putera Larung", "Izzat Nabela Ali", "Katrin Dian Lestari", "Diah", "Gary", "Rika"]
-        pass_hash = make_hashes("123456")
-        new_data = []; 
-        for u in default_users: new_data.append({"username": u, "password": pass_hash})
-        try: conn = get_conn(); conn.update(worksheet="users", data=pd.DataFrame(new_data)); st.toast("Init Users OK", icon="✅")
-        except: pass
+    # Isi user default hanya jika tabel users benar-benar kosong (gagal koneksi -> exception, bukan tabel kosong)
+    df_users = get_storage().load_users()
+    if not df_users.empty: return False
+    default_users = ["Elisa Luhulima", "Ahmad Sobirin", "Dewi Puspita Sari", "Anni Samudra Wulan", "Nafi Alrasyid", "Muhamad Ichsan Kamil", "Oscar Gideon", "Rafael Yolens Putera Larung", "Izzat Nabela Ali", "Katrin Dian Lestari", "Diah", "Gary", "Rika"]
+    pass_hash = make_hashes("123456")
+    get_storage().add_users([{"username": u, "password": pass_hash} for u in default_users])
+    return True
+
+@perf.timed
+@st.cache_resource(show_spinner=False)
+def init_app():
+    # PERBAIKAN: Seeding sekali per proses, bukan setiap rerun. Exception tidak di-cache -> dicoba lagi rerun berikutnya
+    return seed_users_gsheet()
+
+def siapkan_app():
+    # PERBAIKAN: Seeding dipanggil saat login/daftar pertama, bukan di jalur render -> form login tampil tanpa request ke sheet
+    try: init_app()
+    except Exception: pass
+
+@st.cache_resource(show_spinner=False)
+def panaskan_import():
+    # pandas (bagian terberat import halaman utama) dimuat di background selagi user mengisi form login -> klik Masuk
+    # tidak menunggu. storage/laporan sendiri ringan & hanya bisa diimport selama script jalan (path folder app)
+    threading.Thread(target=lambda: [importlib.import_module(m) for m in ("pandas", "pyarrow.parquet")], daemon=True).start()
+
+@st.fragment(run_every=3)
+def status_penyimpanan(user):
+    # Indikator antrian tulis async (hanya fragmen ini yang di-refresh tiap 3 detik)
+    pending, failed = get_storage().write_status(user)
+    if pending: st.info(f"⏳ {pending} perubahan sedang disimpan...")
+    if failed:
+        st.error(f"⚠️ {len(failed)} perubahan gagal disimpan ({failed[-1]['waktu']}): {failed[-1]['error']}")
+        c_retry, c_discard = st.columns(2)
+        if c_retry.button("Coba Lagi", key="retry_write"): get_storage().retry_failed(user); st.rerun()
+        if c_discard.button("Batalkan", key="discard_write"): get_storage().discard_failed(user); st.rerun()
 
 # --- SESSION & INIT ---
 if 'logged_in' not in st.session_state: st.session_state['logged_in'] = False
@@ -335,10 +499,12 @@ if 'username' not in st.session_state: st.session_state['username'] = ''
 if 'jumlah_input' not in st.session_state: st.session_state['jumlah_input'] = 1
 if 'edit_mode' not in st.session_state: st.session_state['edit_mode'] = False
 if 'data_to_edit' not in st.session_state: st.session_state['data_to_edit'] = None
-seed_users_gsheet()
+try: resume_session() if not st.session_state['logged_in'] else refresh_session()
+except Exception: pass
 
 # ================= LOGIN / SIGN UP =================
 if not st.session_state['logged_in']:
+    perf.mark("login")
     col_center = st.columns([1, 8, 1])
     with col_center[1]:
         with st.container(border=True):
@@ -356,12 +522,11 @@ if not st.session_state['logged_in']:
                     btn_login = st.form_submit_button("Masuk")
                     
                     if btn_login:
-                        users = load_users()
-                        if not users.empty and u_in in users['username'].values:
-                            stored_pass = users[users['username']==u_in]['password'].values[0]
-                            if stored_pass == make_hashes(p_in):
-                                st.session_state['logged_in'] = True; st.session_state['username'] = u_in; st.rerun()
-                            else: st.error("Password Salah")
+                        try: login_ok = check_login(u_in, p_in)
+                        except Exception as e: login_ok = None; st.error(f"💥 DETAIL ERROR DATABASE: {e}")
+                        if login_ok:
+                            st.session_state['logged_in'] = True; st.session_state['username'] = u_in; issue_session(u_in); st.rerun()
+                        elif login_ok is False: st.error("Password Salah")
                         else: 
                             st.error("User tidak ditemukan atau Gagal Koneksi.")
 
@@ -378,14 +543,26 @@ if not st.session_state['logged_in']:
                             if create_user(nu, make_hashes(np)): st.success("Sukses! Silakan kembali ke tab Login.")
                             else: st.warning("User sudah ada atau Gagal Koneksi.")
                         else: st.error("Password beda / kosong.")
+    panaskan_import()
 
 # ================= MAIN APP =================
 else:
+    # PERBAIKAN: pandas + storage + laporan (~0.8 dtk saat cold start) hanya dimuat untuk halaman setelah login
+    import pandas as pd
+    from storage import empty_logs, normalize_logs, ConflictError
+    from laporan import format_indo, format_indo_series, generate_excel, iter_excel_rows, prepare_restore, RESTORE_COLUMNS, export_snapshot, load_snapshot
+    from laporan import rekap_harian, rekap_periode, rekap_ringkasan, generate_rekap_excel, REKAP_FREQ
+    perf.mark("sidebar")
     st.sidebar.title(f"Halo, {st.session_state['username']}")
-    if st.sidebar.button("Log Out"): st.session_state['logged_in'] = False; st.session_state['username'] = ''; st.rerun()
+    if st.sidebar.button("Log Out"): end_session(); st.rerun()
+
+    if getattr(get_storage(), 'writer', None) is not None:
+        with st.sidebar: status_penyimpanan(st.session_state['username'])
 
     menu = ["Input Aktivitas", "Laporan & Filter", "Backup & Restore"]
+    if is_supervisor(st.session_state['username']): menu.append("Rekap Supervisor")
     choice = st.sidebar.radio("Navigasi", menu)
+    perf.mark(choice)
 
     with st.container(border=True):
 
@@ -401,15 +578,19 @@ else:
                     e_akt = st.text_area("Uraian", value=dt['aktivitas'], key="edit_uraian_key")
                     e_hsl = st.text_area("Hasil", value=dt['hasil'], key="edit_hasil_key")
                     if st.form_submit_button("Update Data"):
-                        update_data_log(dt['id'], e_tgl, e_wkt, e_akt, e_hsl)
-                        st.success("Data Diperbarui!"); st.session_state['edit_mode'] = False; st.session_state['data_to_edit'] = None; st.rerun()
+                        # PERBAIKAN: Tolak pindah ke slot yang sudah dipakai aktivitas lain
+                        pindah = (str(e_tgl), e_wkt) != (dt['tanggal'], dt['waktu'])
+                        if pindah and e_wkt not in slot_kosong(st.session_state['username'], e_tgl): st.error(f"Slot {e_wkt} pada tanggal itu sudah terisi.")
+                        else:
+                            if update_data_log(dt['id'], e_tgl, e_wkt, e_akt, e_hsl, rev=dt.get('rev')): st.success("Data Diperbarui!")
+                            st.session_state['edit_mode'] = False; st.session_state['data_to_edit'] = None; st.rerun()
                 if st.button("Batal Edit"): st.session_state['edit_mode'] = False; st.session_state['data_to_edit'] = None; st.rerun()
 
             else:
                 # PERBAIKAN: Menampilkan Icon Ombudsman pada Judul
                 st.markdown(f"""
                     <div style="display: flex; align-items: center; gap: 15px; margin-bottom: 20px;">
-                        <img src="data:image/png;base64,{icon_ombudsman}" style="width: 100px; height: auto; border-radius: 8px;">
+                        <img src="{load_assets()['logo.png']}" style="width: 100px; height: auto; border-radius: 8px;">
                         <h1 style="margin: 0; padding: 0;">Input Aktivitas</h1>
                     </div>
                 """, unsafe_allow_html=True)
@@ -418,7 +599,8 @@ else:
                 tgl = st.date_input("Pilih Tanggal", datetime.now(), key="input_tanggal_utama")
                 user = st.session_state['username']
                 
-                existing = count_activity_per_day(user, tgl); sisa = len(TIME_SLOTS) - existing
+                # PERBAIKAN: Slot yang ditawarkan = slot yang benar-benar kosong (bukan TIME_SLOTS[existing:])
+                kosong = slot_kosong(user, tgl); sisa = len(kosong); existing = len(TIME_SLOTS) - sisa
                 if sisa <= 0: st.warning("Slot penuh hari ini.")
                 else:
                     c_add, c_inf = st.columns([1,4])
@@ -430,13 +612,13 @@ else:
                     with st.form("dyn_form"):
                         limit = min(st.session_state['jumlah_input'], sisa); save_list = []
                         for i in range(limit):
-                            slot = TIME_SLOTS[existing + i]; st.markdown(f"**Slot: {slot}**")
+                            slot = kosong[i]; st.markdown(f"**Slot: {slot}**")
                             a = st.text_area("Uraian", key=f"a_{i}"); h = st.text_area("Hasil", key=f"h_{i}")
                             save_list.append({"t":tgl, "w":slot, "a":a, "h":h}); st.divider()
                         if st.form_submit_button("Simpan Semua"):
-                            n = 0
-                            for d in save_list:
-                                if d['a'] and d['h']: add_data(user, d['t'], d['w'], d['a'], d['h']); n += 1
+                            # PERBAIKAN: Semua slot terisi dikirim sekaligus dalam 1 batch append
+                            batch = [{"tanggal": d['t'], "waktu": d['w'], "aktivitas": d['a'], "hasil": d['h']} for d in save_list if d['a'] and d['h']]
+                            n = add_data_batch(user, batch)
                             if n > 0: 
                                 st.success(f"{n} Data Tersimpan!")
                                 st.session_state['jumlah_input'] = 1
@@ -446,72 +628,162 @@ else:
 
         elif choice == "Laporan & Filter":
             st.title("📊 Laporan")
-            c1, c2 = st.columns(2)
+            c1, c2, c3 = st.columns([1, 1, 2])
             # PERBAIKAN: Menambah KEY unik pada date_input laporan
             with c1: sd = st.date_input("Dari", date(2025,1,1), key="filter_dari_key")
             with c2: ed = st.date_input("Sampai", datetime.now(), key="filter_sampai_key")
+            with c3: cari = st.text_input("🔎 Cari uraian / hasil", key="filter_cari_key", placeholder="mis. rapat koor")
             
-            raw = get_filtered_logs(st.session_state['username'], sd, ed)
-            df = pd.DataFrame(raw, columns=['ID','Tanggal','Waktu','Uraian','Hasil'])
+            df = get_filtered_df(st.session_state['username'], sd, ed, cari)
             
             if not df.empty:
-                df_excel = df.copy()
-                df_excel['Tanggal_dt'] = pd.to_datetime(df_excel['Tanggal'])
-                df_excel = df_excel.sort_values(by=['Tanggal_dt', 'Waktu'], ascending=[True, True])
-                df_excel['Tanggal'] = df_excel['Tanggal_dt'].apply(format_indo)
-                
-                excel_data = generate_excel(df_excel[['ID','Tanggal','Waktu','Uraian','Hasil']])
-                st.download_button("📥 Download Excel (Terlama di Atas)", excel_data, f"Laporan_Log.xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+                # PERBAIKAN: Excel baru dibuat saat tombol diklik (deferred), streaming & di-cache per versi data
+                st.download_button("📥 Download Excel (Terlama di Atas)", partial(excel_laporan, st.session_state['username'], sd, ed), f"Laporan_Log.xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
                 
-                df['Tanggal_Indo'] = df['Tanggal'].apply(format_indo)
-                gr = df.groupby('Tanggal_Indo', sort=False) 
+                # PERBAIKAN: Paginasi, hanya halaman yang terlihat yang diambil & dirender (jumlah widget tetap kecil)
+                default_size = int(get_config("laporan").get("page_size", 25))
+                page_sizes = sorted(set(PAGE_SIZES + [default_size]))
+                c_mode, c_size, c_page = st.columns([2, 1, 1])
+                with c_mode: mode = st.radio("Tampilan", ["Tabel", "Kartu"], horizontal=True, key="laporan_mode")
+                with c_size: page_size = st.selectbox("Baris / halaman", page_sizes, index=page_sizes.index(default_size), key="laporan_page_size")
+                n_pages = max(1, -(-len(df) // page_size))
+                with c_page: page_no = st.number_input("Halaman", min_value=1, max_value=n_pages, value=1, step=1, key="laporan_page")
+                st.caption(f"{len(df)} aktivitas, halaman {page_no} dari {n_pages}")
+                page = df.iloc[(page_no - 1) * page_size : page_no * page_size].copy()
+                page['Tanggal_Indo'] = format_indo_series(page['Tanggal'])
+
+                if mode == "Tabel":
+                    event = st.dataframe(
+                        page[['Tanggal_Indo', 'Waktu', 'Uraian', 'Hasil']], hide_index=True,
+                        column_config={"Tanggal_Indo": "Tanggal"}, on_select="rerun", selection_mode="single-row",
+                        key=f"tabel_laporan_{page_no}_{page_size}",
+                    )
+                    if event.selection.rows:
+                        r = page.iloc[event.selection.rows[0]]
+                        st.caption(f"Dipilih: {r['Tanggal_Indo']} | {r['Waktu']}")
+                        c_e, c_d, _ = st.columns([1, 1, 4])
+                        if c_e.button("✏️ Edit", key="tabel_edit"):
+                            st.session_state['edit_mode'] = True; st.session_state['data_to_edit'] = {'id': r['ID'], 'tanggal': r['Tanggal'], 'waktu': r['Waktu'], 'aktivitas': r['Uraian'], 'hasil': r['Hasil'], 'rev': int(r['Rev'])}; st.rerun()
+                        if c_d.button("🗑️ Hapus", key="tabel_hapus"):
+                            if delete_data(r['ID'], rev=int(r['Rev'])): st.toast("Terhapus!")
+                            st.rerun()
+                else:
+                    gr = page.groupby('Tanggal_Indo', sort=False) 
 
-                h1, h2, h3, h4, h5 = st.columns([2, 3, 2, 3, 1])
-                h1.markdown('**Tanggal**'); h2.markdown('**Uraian**'); h3.markdown('**Waktu**'); h4.markdown('**Hasil**'); h5.markdown('**Aksi**')
-                
-                for dt_val, g in gr:
-                    with st.container():
-                        st.divider()
-                        cd, cc = st.columns([2, 9])
-                        with cd: st.write(dt_val)
-                        with cc:
-                            for _, r in g.iterrows():
-                                cu, cw, ch, ca = st.columns([3,2,3,1])
-                                cu.write(f"• {r['Uraian']}"); cw.write(r['Waktu']); ch.write(f"• {r['Hasil']}")
-                                with ca:
-                                    if st.button("✏️", key=f"e_{r['ID']}"):
-                                        st.session_state['edit_mode'] = True; st.session_state['data_to_edit'] = {'id': r['ID'], 'tanggal': r['Tanggal'], 'waktu': r['Waktu'], 'aktivitas': r['Uraian'], 'hasil': r['Hasil']}; st.rerun()
-                                    if st.button("🗑️", key=f"d_{r['ID']}"):
-                                        delete_data(r['ID']); st.toast("Terhapus!"); st.rerun()
-                                st.caption("---")
-            else: st.info("Kosong.")
+                    h1, h2, h3, h4, h5 = st.columns([2, 3, 2, 3, 1])
+                    h1.markdown('**Tanggal**'); h2.markdown('**Uraian**'); h3.markdown('**Waktu**'); h4.markdown('**Hasil**'); h5.markdown('**Aksi**')
+                    
+                    for dt_val, g in gr:
+                        with st.container():
+                            st.divider()
+                            cd, cc = st.columns([2, 9])
+                            with cd: st.write(dt_val)
+                            with cc:
+                                for _, r in g.iterrows():
+                                    cu, cw, ch, ca = st.columns([3,2,3,1])
+                                    cu.write(f"• {r['Uraian']}"); cw.write(r['Waktu']); ch.write(f"• {r['Hasil']}")
+                                    with ca:
+                                        if st.button("✏️", key=f"e_{r['ID']}"):
+                                            st.session_state['edit_mode'] = True; st.session_state['data_to_edit'] = {'id': r['ID'], 'tanggal': r['Tanggal'], 'waktu': r['Waktu'], 'aktivitas': r['Uraian'], 'hasil': r['Hasil'], 'rev': int(r['Rev'])}; st.rerun()
+                                        if st.button("🗑️", key=f"d_{r['ID']}"):
+                                            if delete_data(r['ID'], rev=int(r['Rev'])): st.toast("Terhapus!")
+                                            st.rerun()
+                                    st.caption("---")
+            else: st.info("Tidak ada aktivitas yang cocok dengan pencarian." if cari.strip() else "Kosong.")
             
         elif choice == "Backup & Restore":
-            st.title("🗄️ Restore Data dari Excel")
-            st.warning("⚠️ **Perhatian:** Fitur ini digunakan untuk memasukkan kembali data log aktivitas Anda dari file Excel yang pernah di-download sebelumnya. Pastikan format kolom tidak diubah.")
+            st.title("🗄️ Backup & Restore")
+            user = st.session_state['username']
+            st.subheader("⚡ Backup Cepat (Parquet)")
+            st.caption("Salinan mesin berisi ID & tanggal asli, terkompresi. Restore file ini tidak menggandakan data yang sudah ada.")
+            semua_db = is_supervisor(user) and st.toggle("Seluruh database (semua staf)", key="backup_semua_key")
+            nama_file = f"Backup_{'semua' if semua_db else user}_{date.today()}.parquet"
+            st.download_button("📥 Download Backup Parquet", partial(backup_snapshot, None if semua_db else user), nama_file, "application/vnd.apache.parquet")
+
+            st.subheader("♻️ Restore Data")
+            st.warning("⚠️ **Perhatian:** Fitur ini digunakan untuk memasukkan kembali data log aktivitas Anda dari file Excel (Laporan_Log.xlsx) atau backup Parquet yang pernah di-download sebelumnya. Pastikan format kolom tidak diubah.")
             
-            uploaded_file = st.file_uploader("Pilih file Laporan_Log.xlsx", type=["xlsx"])
+            uploaded_file = st.file_uploader("Pilih file Laporan_Log.xlsx atau backup .parquet", type=["xlsx", "parquet"])
             
-            if uploaded_file is not None:
+            if uploaded_file is not None and uploaded_file.name.lower().endswith('.parquet'):
+                try:
+                    rows, _ = load_snapshot(uploaded_file)
+                    st.write(f"Isi backup: {len(rows)} aktivitas dari {rows['user'].nunique()} user.")
+                    st.dataframe(rows[['user', 'tanggal', 'waktu', 'aktivitas', 'hasil']].head(), hide_index=True)
+                    if st.button("Mulai Restore Backup"):
+                        with st.spinner("Sedang menyimpan data ke database..."):
+                            uploaded_file.seek(0)
+                            masuk, dilewati, rejected = restore_snapshot(user, uploaded_file)
+                            st.success(f"✅ {masuk} aktivitas direstore, {dilewati} dilewati karena sudah ada.")
+                            if not rejected.empty:
+                                st.warning(f"⚠️ {len(rejected)} baris ditolak:")
+                                st.dataframe(rejected, hide_index=True)
+                except Exception as e:
+                    st.error(f"Terjadi kesalahan saat membaca file: {e}")
+            elif uploaded_file is not None:
                 try:
                     df_upload = pd.read_excel(uploaded_file, engine='openpyxl')
                     
-                    required_columns = ['Tanggal', 'Waktu', 'Uraian Kegiatan', 'Hasil']
+                    required_columns = RESTORE_COLUMNS
                     if all(col in df_upload.columns for col in required_columns):
                         df_upload['Tanggal'] = df_upload['Tanggal'].ffill()
                         
                         st.write("Preview Data yang akan di-restore:")
-                        st.dataframe(df_upload[['Tanggal', 'Waktu', 'Uraian Kegiatan', 'Hasil']].head())
+                        st.dataframe(df_upload[required_columns].head())
                         
                         if st.button("Mulai Restore Data"):
                             with st.spinner("Sedang menyimpan data ke database..."):
-                                success_count = restore_data(st.session_state['username'], df_upload)
+                                success_count, rejected = restore_data(st.session_state['username'], df_upload)
                                 if success_count > 0:
                                     st.success(f"✅ Berhasil merestore {success_count} aktivitas!")
                                 else:
                                     st.error("❌ Gagal merestore. Pastikan file tidak kosong dan sesuai format.")
+                                if not rejected.empty:
+                                    st.warning(f"⚠️ {len(rejected)} baris ditolak:")
+                                    st.dataframe(rejected, hide_index=True)
                     else:
                         st.error(f"❌ Format file tidak dikenali. Pastikan file memiliki kolom: {', '.join(required_columns)}")
                         
                 except Exception as e:
-                    st.error(f"Terjadi kesalahan saat membaca file: {e}")
\ No newline at end of file
+                    st.error(f"Terjadi kesalahan saat membaca file: {e}")
+
+        elif choice == "Rekap Supervisor":
+            st.title("👥 Rekap Supervisor")
+            c1, c2, c3 = st.columns([1, 1, 2])
+            with c1: r_sd = st.date_input("Dari", date.today().replace(day=1), key="rekap_dari_key")
+            with c2: r_ed = st.date_input("Sampai", date.today(), key="rekap_sampai_key")
+            with c3: r_nama = st.radio("Periode", list(REKAP_FREQ), index=2, horizontal=True, key="rekap_periode_key")
+            semua = daftar_user()
+            staf = st.multiselect("Staf", semua, default=[u for u in semua if not is_supervisor(u)], key="rekap_staf_key")
+
+            if r_sd > r_ed: st.error("Tanggal awal harus sebelum tanggal akhir.")
+            elif not staf: st.info("Pilih minimal satu staf.")
+            else:
+                harian, _ = rekap_harian_semua(r_sd, r_ed)
+                harian = harian[harian['user'].isin(staf)]
+                tabel = rekap_periode(harian, r_nama, r_sd, r_ed, staf, len(TIME_SLOTS))
+                ringkas = rekap_ringkasan(tabel, len(TIME_SLOTS))
+
+                m1, m2, m3 = st.columns(3)
+                m1.metric("Total Aktivitas", int(ringkas['aktivitas'].sum()))
+                m2.metric("Rata-rata Slot Terisi", f"{ringkas['fill_rate'].mean():.0%}")
+                m3.metric("Staf Tanpa Aktivitas", int((ringkas['aktivitas'] == 0).sum()))
+
+                st.download_button("📥 Download Rekap Excel (semua staf, multi-sheet)", partial(excel_rekap, r_sd, r_ed, tuple(staf)), f"Rekap_{r_sd}_{r_ed}.xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+
+                fill_col = st.column_config.ProgressColumn("Slot Terisi %", format="percent", min_value=0, max_value=1)
+                st.subheader("Ringkasan per Staf")
+                st.dataframe(ringkas[['user', 'aktivitas', 'slot_terisi', 'hari_aktif', 'hari_kerja', 'fill_rate']], hide_index=True,
+                             column_config={"user": "Nama", "aktivitas": "Aktivitas", "slot_terisi": "Slot Terisi", "hari_aktif": "Hari Aktif", "hari_kerja": "Hari Kerja", "fill_rate": fill_col})
+                st.subheader(f"Rekap {r_nama}")
+                st.dataframe(tabel[['label', 'user', 'aktivitas', 'slot_terisi', 'hari_kerja', 'fill_rate']], hide_index=True,
+                             column_config={"label": "Periode", "user": "Nama", "aktivitas": "Aktivitas", "slot_terisi": "Slot Terisi", "hari_kerja": "Hari Kerja", "fill_rate": fill_col})
+
+# --- PANEL DEBUG PERFORMA (opt-in, [debug] perf_panel = true) ---
+perf_summary = perf.finish(state=st.session_state)
+if DEBUG.get("perf_panel", False) and perf_summary:
+    with st.sidebar.expander("⏱️ Debug performa"):
+        st.caption(f"Rerun {perf_summary['waktu']}: {perf_summary['wall_ms']} ms, {perf_summary['backend_calls']} request backend, {perf_summary['bytes']:,} bytes")
+        st.dataframe(perf.summary_frame(perf_summary), hide_index=True)
+        total = perf.TOTAL.summary()
+        st.caption(f"Total proses: {total['backend_calls']} request, {total['bytes']:,} bytes")
@@ -0,0 +1,318 @@
+# Benchmark lapisan data (storage.py + laporan.py) tanpa Google Sheets asli.
+# Contoh:
+#   python bench.py                                  # 1k & 10k baris, semua backend
+#   python bench.py --sizes 1000,100000,500000 --latency 0.2 --bandwidth 2
+#   python bench.py --save                           # simpan hasil sebagai baseline (commit sendiri, bukan ikut commit fitur)
+#   python bench.py --compare                        # bandingkan dengan baseline, exit 1 jika regresi
+#   python bench.py --startup --repeat 5             # cold start app.py sampai form login (proses baru tiap ulangan)
+import argparse
+import io
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+import numpy as np
+import pandas as pd
+from storage import make_storage, normalize_logs
+from laporan import generate_excel, iter_excel_rows, prepare_restore, RESTORE_COLUMNS, export_snapshot, load_snapshot
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_baseline.json")
+APP = os.path.join(os.path.dirname(BASELINE), "app.py")
+STARTUP_TARGET_MS = 400  # target rerun pertama app.py sampai form login tampil (tanpa import & inisialisasi streamlit)
+SLOTS = ["08.00 - 10.00", "10.00 - 12.00", "13.00 - 15.00", "15.00 - 17.00"]
+START = date(2024, 1, 1)
+
+
+# --- FAKE GSheetsConnection: sheet di memori + latensi per request ---
+def _col_no(letters):
+    n = 0
+    for ch in letters: n = n * 26 + ord(ch) - 64
+    return n
+
+def _entered(v, option):
+    # Seperti Sheets: USER_ENTERED menjalankan teks '=...' sebagai rumus, awalan ' menandai teks biasa
+    v = str(v)
+    if option != "USER_ENTERED": return v
+    return v[1:] if v.startswith("'") else "#ERROR!" if v.startswith('=') else v
+
+def _trim(cells):
+    while cells and cells[-1] == '': cells = cells[:-1]
+    return cells
+
+class FakeWorksheet:
+    # Subset API gspread.Worksheet yang dipakai GSheetsStorage
+    def __init__(self, conn, title, rows):
+        self.conn, self.title, self.rows = conn, title, rows
+
+    def _pad(self, r, c):
+        while len(self.rows) < r: self.rows.append([])
+        while len(self.rows[r - 1]) < c: self.rows[r - 1].append('')
+
+    def _set(self, a1, v, option=None):
+        m = re.match(r'([A-Z]+)(\d+)', a1); r, c = int(m.group(2)), _col_no(m.group(1))
+        self._pad(r, c); self.rows[r - 1][c - 1] = _entered(v, option)
+
+    @property
+    def col_count(self): return max([len(r) for r in self.rows] + [1])
+
+    def add_cols(self, n):
+        self.conn._call(); [r.extend([''] * n) for r in self.rows]
+
+    def row_values(self, r):
+        self.conn._call(); return list(self.rows[r - 1]) if len(self.rows) >= r else []
+
+    def col_values(self, c):
+        out = [r[c - 1] if len(r) >= c else '' for r in self.rows]
+        self.conn._call([out]); return out
+
+    def batch_get(self, ranges):
+        out = []
+        for rg in ranges:
+            m = re.match(r'([A-Z]+)(\d+)(?::([A-Z]+)(\d*))?$', rg); c0, r0 = _col_no(m.group(1)), int(m.group(2))
+            c1 = _col_no(m.group(3)) if m.group(3) else c0
+            r1 = int(m.group(4)) if m.group(4) else (len(self.rows) if m.group(3) else r0)
+            out.append([_trim(r[c0 - 1:c1]) for r in self.rows[r0 - 1:r1]])  # seperti API: sel kosong di ujung dibuang
+        self.conn._call([row for vr in out for row in vr]); return out
+
+    def update(self, range_name, values):
+        self.conn._call(); m = re.match(r'([A-Z]+)(\d+)', range_name); r, c = int(m.group(2)), _col_no(m.group(1))
+        for i, row in enumerate(values):
+            for j, v in enumerate(row): self._pad(r + i, c + j); self.rows[r + i - 1][c + j - 1] = str(v)
+
+    def append_rows(self, values, value_input_option=None, insert_data_option=None):
+        self.conn._call(values); first = len(self.rows) + 1
+        self.rows.extend([[_entered(v, value_input_option) for v in row] for row in values])
+        return {"updates": {"updatedRange": f"{self.title}!A{first}:Z{len(self.rows)}"}}
+
+    def batch_update(self, body, value_input_option=None):
+        self.conn._call()
+        if isinstance(body, dict):
+            for rq in body['requests']:
+                rg = rq['deleteDimension']['range']; del self.rows[rg['startIndex']:rg['endIndex']]
+        else:
+            for u in body: self._set(u['range'], u['values'][0][0], value_input_option)
+
+class _FakeSpreadsheet:
+    # Subset API gspread.Spreadsheet
+    def __init__(self, conn): self.conn = conn
+    def worksheet(self, title):
+        from gspread.exceptions import WorksheetNotFound
+        if title not in self.conn.sheets: raise WorksheetNotFound(title)
+        return self.conn.sheets[title]
+    def add_worksheet(self, title, rows, cols):
+        self.conn._call(); self.conn.sheets[title] = FakeWorksheet(self.conn, title, []); return self.conn.sheets[title]
+
+class FakeGSheetsConnection:
+    # Pengganti get_conn(): read/update seperti streamlit_gsheets, tiap request diberi jeda `latency` detik
+    # ditambah waktu transfer payload jika `bandwidth` (MB/detik) diisi
+    def __init__(self, latency=0.0, bandwidth=0.0):
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.calls = 0
+        self.sheets = {}
+        self.book = _FakeSpreadsheet(self)
+        self._lock = threading.Lock()
+
+    def _call(self, cells=None):
+        with self._lock: self.calls += 1
+        delay = self.latency
+        if self.bandwidth and cells: delay += sum(len(str(c)) for row in cells for c in row) / (self.bandwidth * 1e6)
+        if delay: time.sleep(delay)
+
+    def spreadsheet(self): return self.book
+
+    def load(self, worksheet, df):
+        self.sheets[worksheet] = FakeWorksheet(self, worksheet, [list(df.columns)] + df.astype(str).values.tolist())
+
+    def read(self, worksheet, ttl=0):
+        rows = self.sheets[worksheet].rows
+        self._call(rows)
+        if not rows: return pd.DataFrame()
+        w = len(rows[0])
+        return pd.DataFrame([(r + [''] * w)[:w] for r in rows[1:]], columns=rows[0]).replace('', None)
+
+    def update(self, worksheet, data):
+        self.load(worksheet, data.map(lambda v: _entered(v, "USER_ENTERED")))  # set_with_dataframe
+        self._call(self.sheets[worksheet].rows)
+
+
+# --- DATA SINTETIS ---
+def synthetic_logs(n_rows, n_users, seed=0):
+    # n_rows baris tersebar rata ke n_users user, 4 slot per hari kerja, tanggal mundur dari START
+    rng = random.Random(seed)
+    users = [f"user{u:03d}" for u in range(n_users)]
+    recs = []
+    for i in range(n_rows):
+        user, k = users[i % n_users], i // n_users
+        recs.append({"user": user, "tanggal": str(START + timedelta(days=k // len(SLOTS))), "waktu": SLOTS[k % len(SLOTS)],
+                     "aktivitas": f"Kegiatan {rng.randint(1, 10**6)} rapat koordinasi", "hasil": rng.choice(["Selesai", "Proses", ""]), "id": i + 1, "rev": 0})
+    return users, pd.DataFrame(recs)
+
+def make_store(backend, logs, users, latency, tmpdir, bandwidth=0.0):
+    if backend == "sqlite":
+        path = os.path.join(tmpdir, f"bench_{len(logs)}.db")
+        if os.path.exists(path): os.remove(path)
+        store = make_storage({"backend": "sqlite", "sqlite_path": path}, None)
+        with store._lock:
+            store._db.executemany("INSERT INTO logs (id, user, tanggal, waktu, aktivitas, hasil, rev) VALUES (:id, :user, :tanggal, :waktu, :aktivitas, :hasil, :rev)", logs.to_dict('records'))
+        store.add_users([{"username": u, "password": "x"} for u in users])
+        return store, None
+    conn = FakeGSheetsConnection(latency, bandwidth)
+    conn.load("logs", logs); conn.load("users", pd.DataFrame({"username": users, "password": "x"}))
+    cfg = {"backend": "gsheets", "cache": backend != "gsheets-nocache"}
+    if backend == "gsheets-delta":
+        # sync_interval 0: tiap load_logs_cold benar-benar menjalankan sync delta ke sheet
+        cfg.update(sync="delta", snapshot_path=os.path.join(tmpdir, f"snap_{len(logs)}.db"), sync_interval=0)
+    return make_storage(cfg, lambda: conn), conn
+
+
+# --- SKENARIO (padanan helper di app.py) ---
+def restore_file(n, day):
+    # File restore seperti hasil export: Tanggal Indonesia, Waktu, Uraian Kegiatan, Hasil
+    return pd.DataFrame({"Tanggal": [f"{(day + timedelta(days=i // 4)).day} Januari 2030" for i in range(n)],
+                         "Waktu": [SLOTS[i % 4] for i in range(n)], "Uraian Kegiatan": [f"restore {i}" for i in range(n)], "Hasil": ""}, columns=RESTORE_COLUMNS)
+
+def scenarios(store, users, rng):
+    row = lambda: {"tanggal": str(START + timedelta(days=rng.randint(0, 3000))), "waktu": rng.choice(SLOTS), "aktivitas": "bench", "hasil": ""}
+    def filtered():
+        d = START + timedelta(days=rng.randint(0, 60))
+        return store.query_logs(rng.choice(users), d, d + timedelta(days=30)).values.tolist()
+    def cold():
+        if hasattr(store, "invalidate"): store.invalidate()
+        return store.load_logs()
+    def restore():
+        rows, _ = prepare_restore(restore_file(100, date(2030, 1, 1)))
+        return store.append_logs(rng.choice(users), rows.to_dict('records'))
+    snapshot = export_snapshot(normalize_logs(store.load_logs()), 'semua')
+    return {
+        "load_logs": store.load_logs,
+        "load_logs_cold": cold,
+        "get_filtered_logs": filtered,
+        "search_logs": lambda: store.search_logs(rng.choice(users), START, START + timedelta(days=365), rng.choice(["rapat", "selesai koord", "kegiatan 5"])),
+        "count_activity_per_day": lambda: store.count_logs(rng.choice(users), START + timedelta(days=rng.randint(0, 60))),
+        "slot_terisi": lambda: store.slot_mask(rng.choice(users), START + timedelta(days=rng.randint(0, 60)), SLOTS),
+        "add_data": lambda: store.append_logs(rng.choice(users), [row()]),
+        "restore_data": restore,
+        "generate_excel": lambda: generate_excel(iter_excel_rows(store.user_logs(rng.choice(users)))),
+        "backup_snapshot": lambda: export_snapshot(normalize_logs(store.load_logs()), 'semua'),
+        "restore_snapshot": lambda: store.restore_logs(load_snapshot(io.BytesIO(snapshot))[0]),  # upload ulang: semua id sudah ada
+    }
+
+def measure(fn, repeat):
+    fn()  # pemanasan (koneksi, cache, import)
+    out = []
+    for _ in range(repeat):
+        t = time.perf_counter(); fn(); out.append((time.perf_counter() - t) * 1000)
+    return out
+
+def run(args):
+    rng = random.Random(1)
+    results = {}
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for size in args.sizes:
+            users, logs = synthetic_logs(size, args.users)
+            for backend in args.backends:
+                store, conn = make_store(backend, logs, users, args.latency, tmpdir, args.bandwidth)
+                for name, fn in scenarios(store, users, rng).items():
+                    if args.only and name not in args.only: continue
+                    calls0 = conn.calls if conn else 0
+                    ms = measure(fn, args.repeat)
+                    key = f"{backend}/{size}/{name}"
+                    results[key] = {"p50": round(float(np.percentile(ms, 50)), 3), "p95": round(float(np.percentile(ms, 95)), 3),
+                                    "calls": round(((conn.calls - calls0) / (args.repeat + 1)) if conn else 0, 2)}
+                    print(f"{key:<50} p50 {results[key]['p50']:>10.2f} ms   p95 {results[key]['p95']:>10.2f} ms   req/op {results[key]['calls']}", flush=True)
+                if getattr(store, "writer", None) is not None: store.writer.flush(30)
+    return results
+
+# --- COLD START: tiap ulangan proses python baru, AppTest menjalankan app.py sekali sampai form login ---
+STARTUP_CHILD = """
+import json, sys, time
+t0 = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+AppTest.from_string("import streamlit as st; st.text_input('x')").run()  # inisialisasi runtime (scan komponen dll.), di server terjadi saat boot
+t1 = time.perf_counter()
+at = AppTest.from_file(sys.argv[1], default_timeout=120)
+at.secrets["storage"] = json.loads(sys.argv[2])
+at.run()
+t2 = time.perf_counter()
+ok = not at.exception and any(w.key == "l_u" for w in at.text_input)
+print(json.dumps({"streamlit": (t1 - t0) * 1000, "login_form": (t2 - t1) * 1000, "ok": ok}))
+"""
+
+def run_startup(args):
+    # gsheets tanpa kredensial: form login harus tetap tampil tanpa membuka koneksi ke sheet
+    results = {}
+    with tempfile.TemporaryDirectory() as tmpdir:
+        configs = {"sqlite": {"backend": "sqlite", "sqlite_path": os.path.join(tmpdir, "startup.db")}, "gsheets": {"backend": "gsheets"}}
+        for backend, cfg in configs.items():
+            runs = []
+            for _ in range(args.repeat):
+                out = subprocess.run([sys.executable, "-c", STARTUP_CHILD, APP, json.dumps(cfg)], capture_output=True, text=True, cwd=tmpdir)
+                r = json.loads(out.stdout.strip().splitlines()[-1])
+                if not r["ok"]: raise RuntimeError(f"startup {backend}: form login tidak tampil\n{out.stderr[-2000:]}")
+                runs.append(r)
+            for name in ("streamlit", "login_form"):
+                ms = [r[name] for r in runs]
+                key = f"startup/{backend}/{name}"
+                results[key] = {"p50": round(float(np.percentile(ms, 50)), 3), "p95": round(float(np.percentile(ms, 95)), 3), "calls": 0}
+                print(f"{key:<50} p50 {results[key]['p50']:>10.2f} ms   p95 {results[key]['p95']:>10.2f} ms", flush=True)
+    slow = [k for k, r in results.items() if k.endswith("/login_form") and r['p50'] > STARTUP_TARGET_MS]
+    print(f"\nTarget form login <= {STARTUP_TARGET_MS} ms: " + (f"GAGAL ({', '.join(slow)})" if slow else "OK"))
+    return results, slow
+
+def compare(results, baseline, tolerance):
+    # Regresi = p50 lebih lambat dari baseline * (1 + tolerance); selisih < 1 ms dianggap noise
+    bad = []
+    print(f"\n{'skenario':<50} {'baseline':>10} {'sekarang':>10} {'rasio':>7}")
+    for key, r in results.items():
+        if key not in baseline: continue
+        old, new = baseline[key]['p50'], r['p50']
+        ratio = new / old if old else float('inf')
+        flag = new - old > 1 and ratio > 1 + tolerance
+        if flag: bad.append(key)
+        print(f"{key:<50} {old:>10.2f} {new:>10.2f} {ratio:>6.2f}x{'  <-- REGRESI' if flag else ''}")
+    return bad
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Benchmark lapisan data LKPKT")
+    p.add_argument("--sizes", default="1000,10000", help="jumlah baris log, dipisah koma (mis. 1000,100000,500000)")
+    p.add_argument("--users", type=int, default=50)
+    p.add_argument("--backends", default="sqlite,gsheets,gsheets-nocache,gsheets-delta")
+    p.add_argument("--only", default="", help="hanya skenario tertentu, dipisah koma")
+    p.add_argument("--repeat", type=int, default=10)
+    p.add_argument("--latency", type=float, default=0.0, help="jeda simulasi per request Sheets (detik)")
+    p.add_argument("--bandwidth", type=float, default=0.0, help="simulasi bandwidth Sheets (MB/detik), 0 = tanpa batas")
+    p.add_argument("--save", action="store_true", help=f"simpan hasil ke {os.path.basename(BASELINE)}")
+    p.add_argument("--compare", action="store_true", help="bandingkan dengan baseline")
+    p.add_argument("--tolerance", type=float, default=0.25)
+    p.add_argument("--startup", action="store_true", help=f"ukur cold start app.py sampai form login (target {STARTUP_TARGET_MS} ms)")
+    args = p.parse_args(argv)
+    args.sizes = [int(s) for s in args.sizes.split(",")]
+    args.backends = args.backends.split(",")
+    args.only = set(filter(None, args.only.split(",")))
+
+    slow = []
+    if args.startup: results, slow = run_startup(args)
+    else: results = run(args)
+    meta = {"python": sys.version.split()[0], "pandas": pd.__version__, "repeat": args.repeat, "latency": args.latency, "bandwidth": args.bandwidth, "users": args.users}
+    if args.compare:
+        if not os.path.exists(BASELINE): print("Baseline belum ada, jalankan dulu dengan --save"); return 1
+        with open(BASELINE) as f: baseline = json.load(f)
+        bad = compare(results, baseline["results"], args.tolerance)
+        if bad: print(f"\n{len(bad)} skenario regresi"); return 1
+    if args.save:
+        old = {}
+        if os.path.exists(BASELINE):
+            with open(BASELINE) as f: old = json.load(f).get("results", {})
+        with open(BASELINE, "w") as f: json.dump({"meta": meta, "results": {**old, **results}}, f, indent=1, sort_keys=True)
+        print(f"\nBaseline disimpan: {BASELINE}")
+    return 1 if slow else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,246 @@
+import io
+import itertools
+import re
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from datetime import datetime
+
+# --- HELPER LAPORAN EXCEL (format tanggal Indonesia, restore) & SNAPSHOT PARQUET ---
+
+BULAN = {'Januari': 1, 'Februari': 2, 'Maret': 3, 'April': 4, 'Mei': 5, 'Juni': 6, 'Juli': 7, 'Agustus': 8, 'September': 9, 'Oktober': 10, 'November': 11, 'Desember': 12}
+RESTORE_COLUMNS = ['Tanggal', 'Waktu', 'Uraian Kegiatan', 'Hasil']
+NAMA_BULAN = {v: k for k, v in BULAN.items()}
+REKAP_FREQ = {'Harian': 'D', 'Mingguan': 'W-SUN', 'Bulanan': 'M'}  # minggu = Senin s/d Minggu
+
+def format_indo(tgl_str):
+    try:
+        if isinstance(tgl_str, str): tgl_obj = datetime.strptime(tgl_str, '%Y-%m-%d').date()
+        else: tgl_obj = tgl_str
+        hari = {'Monday': 'Senin', 'Tuesday': 'Selasa', 'Wednesday': 'Rabu', 'Thursday': 'Kamis', 'Friday': 'Jumat', 'Saturday': 'Sabtu', 'Sunday': 'Minggu'}
+        bulan = {1: 'Januari', 2: 'Februari', 3: 'Maret', 4: 'April', 5: 'Mei', 6: 'Juni', 7: 'Juli', 8: 'Agustus', 9: 'September', 10: 'Oktober', 11: 'November', 12: 'Desember'}
+        return f"{hari[tgl_obj.strftime('%A')]}, {tgl_obj.day} {bulan[tgl_obj.month]} {tgl_obj.year}"
+    except: return str(tgl_str)
+
+def format_indo_series(s):
+    # format_indo untuk satu kolom: dihitung sekali per tanggal unik
+    return s.map({t: format_indo(t) for t in s.unique()})
+
+def parse_tanggal_series(s):
+    # Versi vektor dari reverse_format_indo: "Senin, 5 Januari 2025" / "5 Januari 2025" / ISO / datetime -> 'YYYY-MM-DD'
+    # Tanggal yang tidak dikenali menjadi NaN
+    txt = s.astype(str).str.strip()
+    parts = txt.str.extract(r'(\d{1,2})\s+([A-Za-z]+)\s+(\d{4})$')
+    indo = pd.to_datetime(pd.DataFrame({
+        'year': pd.to_numeric(parts[2], errors='coerce'),
+        'month': parts[1].str.capitalize().map(BULAN),
+        'day': pd.to_numeric(parts[0], errors='coerce'),
+    }), errors='coerce')
+    iso = pd.to_datetime(txt.where(indo.isna()), errors='coerce', format='ISO8601')
+    return indo.fillna(iso).dt.strftime('%Y-%m-%d')
+
+def prepare_restore(df_uploaded):
+    # Validasi seluruh file sekaligus dengan mask; hasil: (baris siap simpan, baris ditolak + alasan)
+    df = df_uploaded[RESTORE_COLUMNS].copy()
+    df['Tanggal'] = df['Tanggal'].ffill()  # sel tanggal di-merge pada file export
+    df = df[df[['Waktu', 'Uraian Kegiatan', 'Hasil']].notna().any(axis=1)]  # baris kosong total diabaikan
+    tanggal = parse_tanggal_series(df['Tanggal'])
+    blank = lambda col: df[col].isna() | (df[col].astype(str).str.strip() == '')
+
+    alasan = pd.Series('', index=df.index)
+    alasan = alasan.mask(blank('Uraian Kegiatan'), 'Uraian kosong')
+    alasan = alasan.mask(blank('Waktu'), 'Waktu kosong')
+    alasan = alasan.mask(tanggal.isna(), 'Tanggal tidak dikenali')
+    ok = alasan == ''
+
+    rows = pd.DataFrame({
+        'tanggal': tanggal[ok],
+        'waktu': df.loc[ok, 'Waktu'].astype(str).str.strip(),
+        'aktivitas': df.loc[ok, 'Uraian Kegiatan'].astype(str),
+        'hasil': df.loc[ok, 'Hasil'].fillna('').astype(str),
+    })
+    rejected = df.loc[~ok].assign(Alasan=alasan[~ok])
+    rejected.insert(0, 'Baris', rejected.index + 2)  # nomor baris di Excel (baris 1 = header)
+    return rows, rejected
+
+# Snapshot mesin (backup cepat): kolom bertipe, tanpa format tampilan -> restore tanpa parsing teks
+SNAPSHOT_SCHEMA = pa.schema([('id', pa.int64()), ('user', pa.string()), ('tanggal', pa.date32()), ('waktu', pa.string()),
+                             ('aktivitas', pa.string()), ('hasil', pa.string()), ('rev', pa.int64())])
+
+def export_snapshot(df, scope):
+    # df = tabel logs (bentuk normalize_logs); scope = nama user / 'semua', disimpan di metadata file
+    teks = lambda col: df[col].fillna('').astype(str)
+    frame = pd.DataFrame({'id': df['id'].astype('int64'), 'user': teks('user'), 'tanggal': pd.to_datetime(df['tanggal'], errors='coerce', format='%Y-%m-%d'),
+                          'waktu': teks('waktu'), 'aktivitas': teks('aktivitas'), 'hasil': teks('hasil'), 'rev': df['rev'].fillna(0).astype('int64')})
+    table = pa.Table.from_pandas(frame.sort_values('id'), preserve_index=False).cast(SNAPSHOT_SCHEMA)
+    table = table.replace_schema_metadata({'lkpkt.scope': str(scope), 'lkpkt.dibuat': datetime.now().isoformat(timespec='seconds')})
+    output = io.BytesIO()
+    pq.write_table(table, output, compression='zstd')
+    return output.getvalue()
+
+def load_snapshot(source):
+    # -> (baris siap restore dengan id asli, baris ditolak + alasan). Kolom wajib hilang -> ValueError
+    table = pq.read_table(source)
+    kurang = [c for c in SNAPSHOT_SCHEMA.names if c not in table.column_names]
+    if kurang: raise ValueError(f"Kolom snapshot tidak lengkap: {', '.join(kurang)}")
+    df = table.select(SNAPSHOT_SCHEMA.names).to_pandas(date_as_object=False)
+    blank = lambda col: df[col].isna() | (df[col].astype(str).str.strip() == '')
+
+    alasan = pd.Series('', index=df.index)
+    alasan = alasan.mask(df['id'].duplicated(), 'ID ganda')
+    alasan = alasan.mask(blank('aktivitas'), 'Uraian kosong')
+    alasan = alasan.mask(blank('waktu'), 'Waktu kosong')
+    alasan = alasan.mask(blank('user'), 'User kosong')
+    alasan = alasan.mask(df['tanggal'].isna(), 'Tanggal kosong')
+    alasan = alasan.mask(df['id'].isna(), 'ID kosong')
+    ok = alasan == ''
+
+    rows = df[ok].assign(id=df.loc[ok, 'id'].astype(int), tanggal=df.loc[ok, 'tanggal'].dt.strftime('%Y-%m-%d'),
+                         hasil=df.loc[ok, 'hasil'].fillna(''), rev=df.loc[ok, 'rev'].fillna(0).astype(int)).reset_index(drop=True)
+    return rows, df.loc[~ok].assign(Alasan=alasan[~ok])
+
+def iter_excel_rows(df):
+    # Baris laporan (ID, Tanggal, Waktu, Uraian, Hasil), tanggal terlama di atas
+    if df.empty: return
+    df = df.sort_values(by=['tanggal', 'waktu'])
+    cols = [df['id'].tolist(), format_indo_series(df['tanggal']).tolist(), df['waktu'].tolist(),
+            df['aktivitas'].fillna('').tolist(), df['hasil'].fillna('').tolist()]
+    yield from zip(*cols)
+
+# PERBAIKAN: laporan sampai MERGE_MAX_ROWS baris ditulis mode biasa dengan tanggal di-merge (merge_range, API
+# publik; sel ditahan di memori sampai close(), ~1 KB per baris). Di atasnya constant_memory (memori tetap ~2 MB):
+# merge_range tidak bisa dipakai di mode itu (sel kosong yang ditulis ke depan mem-flush baris lain sebelum
+# terisi), jadi tanggal hanya ditulis di baris pertama tiap hari, baris lain sel kosong berformat sama.
+MERGE_MAX_ROWS = 5000
+
+def _workbook(output, constant_memory=False):
+    # Import lazy: xlsxwriter baru dimuat saat tombol download pertama, tidak di cold start halaman login.
+    # strings_to_formulas False: uraian/hasil berawalan '=' tetap teks, bukan rumus Excel
+    import xlsxwriter
+    return xlsxwriter.Workbook(output, {'constant_memory': constant_memory, 'strings_to_formulas': False})
+
+def _formats(workbook):
+    return {
+        'header': workbook.add_format({'bold': True, 'bg_color': '#9bc2e6', 'border': 1, 'align': 'center', 'valign': 'vcenter'}),
+        'body': workbook.add_format({'text_wrap': True, 'border': 1, 'valign': 'top', 'align': 'left'}),
+        'center': workbook.add_format({'text_wrap': True, 'border': 1, 'valign': 'top', 'align': 'center'}),
+        'date_merge': workbook.add_format({'text_wrap': True, 'border': 1, 'valign': 'vcenter', 'align': 'center'}),
+        'pct': workbook.add_format({'border': 1, 'num_format': '0.0%', 'align': 'center'}),
+    }
+
+def _write_laporan(worksheet, rows, fmt, merge=True):
+    # Layout laporan per user: tanggal di-merge per hari (merge=False: constant_memory, tanpa merge),
+    # sel ditulis urut baris lalu kolom
+    worksheet.set_column('A:A', 5); worksheet.set_column('B:B', 25); worksheet.set_column('C:C', 15)
+    worksheet.set_column('D:D', 50); worksheet.set_column('E:E', 30)
+
+    headers = ['ID', 'Tanggal', 'Waktu', 'Uraian Kegiatan', 'Hasil']
+    for col, h in enumerate(headers): worksheet.write(0, col, h, fmt['header'])
+
+    curr_row = 1
+    for date_val, group in itertools.groupby(rows, key=lambda r: r[1]):
+        group = list(group)  # satu tanggal hanya beberapa slot
+        first_row = curr_row
+        for i, (log_id, _, waktu, uraian, hasil) in enumerate(group):
+            worksheet.write(curr_row, 0, log_id, fmt['center'])
+            if len(group) == 1: worksheet.write(curr_row, 1, str(date_val), fmt['center'])
+            elif not merge and i == 0: worksheet.write(curr_row, 1, str(date_val), fmt['date_merge'])
+            elif not merge: worksheet.write_blank(curr_row, 1, None, fmt['date_merge'])
+            worksheet.write(curr_row, 2, waktu, fmt['center'])
+            worksheet.write(curr_row, 3, uraian, fmt['body'])
+            worksheet.write(curr_row, 4, hasil, fmt['body'])
+            curr_row += 1
+        if merge and len(group) > 1: worksheet.merge_range(first_row, 1, curr_row - 1, 1, str(date_val), fmt['date_merge'])
+
+def generate_excel(rows):
+    # rows: iterable/generator baris laporan yang sudah urut per tanggal (tanpa DataFrame perantara)
+    rows = iter(rows)
+    head = list(itertools.islice(rows, MERGE_MAX_ROWS + 1))
+    big = len(head) > MERGE_MAX_ROWS
+    output = io.BytesIO()
+    workbook = _workbook(output, constant_memory=big)
+    _write_laporan(workbook.add_worksheet('Laporan'), itertools.chain(head, rows), _formats(workbook), merge=not big)
+    workbook.close()
+    return output.getvalue()
+
+
+# --- REKAP SUPERVISOR (semua user sekaligus, vektor) ---
+
+def rekap_harian(df, slots):
+    # Satu pass groupby: per (user, tanggal) jumlah aktivitas & jumlah slot berbeda yang terisi
+    if df.empty: return pd.DataFrame({'user': pd.Series(dtype=object), 'tanggal': pd.Series(dtype=object), 'aktivitas': pd.Series(dtype=int), 'slot_terisi': pd.Series(dtype=int), 'libur': pd.Series(dtype=bool)})
+    slot = df['waktu'].where(df['waktu'].isin(slots))
+    g = df.assign(slot=slot).groupby(['user', 'tanggal'], sort=True)
+    out = g.agg(aktivitas=('id', 'size'), slot_terisi=('slot', 'nunique')).reset_index()
+    out['libur'] = ~np.is_busday(pd.to_datetime(out['tanggal']).values.astype('datetime64[D]'))  # Sabtu/Minggu
+    return out
+
+def _label_periode(per, nama):
+    start, end = per.start_time, per.end_time
+    if nama == 'Harian': return format_indo(start.date())
+    if nama == 'Bulanan': return f"{NAMA_BULAN[start.month]} {start.year}"
+    return f"{start:%d/%m} - {end:%d/%m/%Y}"
+
+def rekap_periode(harian, nama, start_date, end_date, users, n_slots):
+    # Gabung rekap harian ke periode (Harian/Mingguan/Bulanan). Grid lengkap user x periode,
+    # jadi staf tanpa aktivitas tetap muncul dengan 0.
+    # Fill rate = slot terisi / ((hari kerja + hari libur yang diisi) x jumlah slot), maksimal 100%.
+    freq = REKAP_FREQ[nama]
+    periods = pd.period_range(start_date, end_date, freq=freq)
+    per = pd.to_datetime(harian['tanggal']).dt.to_period(freq)
+    agg = harian.assign(periode=per).groupby(['user', 'periode']).agg(
+        aktivitas=('aktivitas', 'sum'), slot_terisi=('slot_terisi', 'sum'), hari_aktif=('tanggal', 'size'), libur_aktif=('libur', 'sum'))
+    out = agg.reindex(pd.MultiIndex.from_product([users, periods], names=['user', 'periode']), fill_value=0).reset_index()
+
+    # Hari kerja (Senin-Jumat) tiap periode, dipotong ke rentang laporan
+    lo = np.maximum(periods.start_time.values.astype('datetime64[D]'), np.datetime64(start_date))
+    hi = np.minimum(periods.end_time.values.astype('datetime64[D]'), np.datetime64(end_date)) + 1
+    kerja = pd.Series(np.busday_count(lo, hi), index=periods)
+    out['hari_kerja'] = out['periode'].map(kerja).astype(int)
+    out['fill_rate'] = _fill_rate(out, n_slots)
+    out['label'] = out['periode'].map({p: _label_periode(p, nama) for p in periods})
+    return out
+
+def rekap_ringkasan(per_periode, n_slots):
+    # Total per user atas seluruh rentang (periode tidak tumpang tindih, jadi hari kerja bisa dijumlah)
+    out = per_periode.groupby('user', sort=True)[['aktivitas', 'slot_terisi', 'hari_aktif', 'libur_aktif', 'hari_kerja']].sum().reset_index()
+    out['fill_rate'] = _fill_rate(out, n_slots)
+    return out
+
+def _fill_rate(df, n_slots):
+    kapasitas = (df['hari_kerja'] + df['libur_aktif']) * n_slots
+    return (df['slot_terisi'] / kapasitas.where(kapasitas > 0)).fillna(0.0)
+
+def _sheet_name(name, used):
+    # Nama sheet Excel: maks 31 karakter, tanpa []:*?/\, unik
+    base = re.sub(r'[\[\]:*?/\\]', '_', str(name))[:31] or 'Sheet'
+    name, i = base, 2
+    while name.lower() in used: name = f"{base[:28]}~{i}"; i += 1
+    used.add(name.lower())
+    return name
+
+REKAP_HEADERS = [('label', 'Periode', 24), ('user', 'Nama', 28), ('aktivitas', 'Aktivitas', 11), ('slot_terisi', 'Slot Terisi', 11),
+                 ('hari_aktif', 'Hari Aktif', 11), ('hari_kerja', 'Hari Kerja', 11), ('fill_rate', 'Fill Rate', 10)]
+
+def _write_table(worksheet, df, fmt, cols):
+    for c, (_, title, width) in enumerate(cols):
+        worksheet.set_column(c, c, width); worksheet.write(0, c, title, fmt['header'])
+    for r, row in enumerate(df[[k for k, _, _ in cols]].itertuples(index=False), start=1):
+        for c, v in enumerate(row):
+            worksheet.write(r, c, v, fmt['pct'] if cols[c][0] == 'fill_rate' else fmt['center'])
+
+def generate_rekap_excel(ringkasan, per_periode, detail):
+    # Satu workbook untuk supervisor: Ringkasan, satu sheet per jenis periode, lalu detail log per user
+    # per_periode: {'Harian': df, ...}; detail: {user: DataFrame log user itu}
+    big = len(ringkasan) + sum(map(len, per_periode.values())) + sum(map(len, detail.values())) > MERGE_MAX_ROWS
+    output = io.BytesIO()
+    workbook = _workbook(output, constant_memory=big)
+    fmt = _formats(workbook); used = set()
+    _write_table(workbook.add_worksheet(_sheet_name('Ringkasan', used)), ringkasan, fmt, REKAP_HEADERS[1:])
+    for nama, df in per_periode.items():
+        _write_table(workbook.add_worksheet(_sheet_name(f"Per {nama}", used)), df, fmt, REKAP_HEADERS)
+    for user, df in detail.items():
+        _write_laporan(workbook.add_worksheet(_sheet_name(user, used)), iter_excel_rows(df), fmt, merge=not big)
+    workbook.close()
+    return output.getvalue()
@@ -0,0 +1,151 @@
+import json
+import logging
+import threading
+import time
+from functools import wraps
+
+# --- INSTRUMENTASI RINGAN PER RERUN ---
+# Tiap rerun Streamlit berjalan di thread script sesi itu; pencatat aktif disimpan thread-local,
+# sehingga sesi lain & thread BackgroundWriter tidak tercampur (yang terakhir masuk ke TOTAL proses).
+# Biaya per panggilan: satu perf_counter() + update dict; ukuran byte hanya dihitung untuk request jaringan.
+
+log = logging.getLogger("lkpkt.perf")
+_local = threading.local()
+_lock = threading.Lock()
+
+class Rerun:
+    def __init__(self, label=""):
+        self.label = label
+        self.t0 = self.t_end = time.perf_counter()
+        self.started_at = time.strftime('%H:%M:%S')
+        self.stats = {}      # (jenis, nama) -> [jumlah, detik, bytes]
+        self.section = None  # (nama, mulai) bagian halaman yang sedang berjalan
+        self.done = False
+
+    def add(self, kind, name, dt, nbytes=0):
+        c = self.stats.setdefault((kind, name), [0, 0.0, 0])
+        c[0] += 1; c[1] += dt; c[2] += nbytes
+        self.t_end = time.perf_counter()
+
+    def mark(self, name):
+        now = time.perf_counter()
+        if self.section: self.add("section", self.section[0], now - self.section[1])
+        self.section = (name, now) if name else None
+
+    def summary(self):
+        kinds = {}
+        for (kind, name), (n, dt, b) in self.stats.items():
+            kinds.setdefault(kind, {})[name] = {"n": n, "ms": round(dt * 1000, 2), "bytes": b}
+        backend = kinds.get("backend", {})
+        return {"event": "rerun", "label": self.label, "waktu": self.started_at, "wall_ms": round((self.t_end - self.t0) * 1000, 2),
+                "backend_calls": sum(v["n"] for v in backend.values()), "bytes": sum(v["bytes"] for v in backend.values()), **kinds}
+
+class _Total(Rerun):
+    # Akumulasi seumur proses (termasuk penulisan di thread latar), dipakai bersama semua sesi
+    def add(self, kind, name, dt, nbytes=0):
+        with _lock: super().add(kind, name, dt, nbytes)
+
+    def summary(self):
+        with _lock: return super().summary()
+
+TOTAL = _Total("proses")
+
+def current():
+    return getattr(_local, "rerun", None)
+
+def record(kind, name, dt, nbytes=0):
+    r = current()
+    if r is not None and not r.done: r.add(kind, name, dt, nbytes)
+    TOTAL.add(kind, name, dt, nbytes)
+
+def start_rerun(state, label=""):
+    # Dipanggil di awal script. Rerun sebelumnya yang berhenti lewat st.rerun()/st.stop() ditutup di sini.
+    finish(state.get("_perf"), state)
+    _local.rerun = state["_perf"] = Rerun(label)
+    return _local.rerun
+
+def mark(name):
+    # Batas bagian halaman (tanpa perlu indentasi ulang): waktu dihitung sampai mark()/finish() berikutnya
+    r = current()
+    if r is not None: r.mark(name)
+
+def finish(r=None, state=None):
+    r = r or current()
+    if r is None or r.done: return None
+    r.mark(None); r.done = True
+    s = r.summary()
+    if state is not None: state["_perf_last"] = s
+    if log.isEnabledFor(logging.INFO): log.info(json.dumps(s, default=str))
+    return s
+
+def enable_log(level=logging.INFO):
+    # Log terstruktur: satu baris JSON per rerun ke stderr (terlihat di log Streamlit Cloud)
+    if not log.handlers:
+        h = logging.StreamHandler(); h.setFormatter(logging.Formatter("%(asctime)s %(name)s %(message)s")); log.addHandler(h)
+    log.setLevel(level); log.propagate = False
+
+def timed(fn=None, name=None, kind="helper"):
+    # Dekorator helper app.py: jumlah panggilan & waktu total per rerun
+    if fn is None: return lambda f: timed(f, name, kind)
+    label = name or fn.__name__
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        t = time.perf_counter()
+        try: return fn(*args, **kwargs)
+        finally: record(kind, label, time.perf_counter() - t)
+    return wrapper
+
+def nbytes(obj):
+    # Perkiraan ukuran payload (hanya untuk request jaringan, jadi biaya ini kecil dibanding round-trip)
+    if obj is None: return 0
+    if hasattr(obj, 'memory_usage'): return int(obj.memory_usage(index=False, deep=True).sum())  # DataFrame, tanpa import pandas
+    try: return len(json.dumps(obj, default=str))
+    except Exception: return 0
+
+
+# --- PROXY KONEKSI: setiap request ke Google Sheets dihitung ---
+class _Proxy:
+    def __init__(self, target, prefix):
+        self._target, self._prefix = target, prefix
+
+    def __getattr__(self, attr):
+        val = getattr(self._target, attr)
+        if not callable(val): return val
+        name = self._prefix + attr
+        def call(*args, **kwargs):
+            t = time.perf_counter(); out = val(*args, **kwargs)
+            record("backend", name, time.perf_counter() - t, nbytes(out) + nbytes([args, kwargs]))
+            return out
+        return call
+
+class _BookProxy:
+    def __init__(self, book): self._book = book
+    def __getattr__(self, attr): return getattr(self._book, attr)
+    def worksheet(self, title): return _Proxy(self._book.worksheet(title), "ws.")
+
+class InstrumentedConn:
+    # Bungkus GSheetsConnection: conn.read/conn.update dan panggilan gspread lewat conn.spreadsheet() dicatat
+    def __init__(self, conn, open_spreadsheet):
+        self._conn, self._open_spreadsheet = conn, open_spreadsheet
+
+    def spreadsheet(self): return _BookProxy(self._open_spreadsheet())
+
+    def __getattr__(self, attr): return getattr(self._conn, attr)
+
+    def read(self, *args, **kwargs):
+        t = time.perf_counter(); df = self._conn.read(*args, **kwargs)
+        record("backend", "conn.read", time.perf_counter() - t, nbytes(df))
+        return df
+
+    def update(self, *args, **kwargs):
+        t = time.perf_counter(); out = self._conn.update(*args, **kwargs)
+        record("backend", "conn.update", time.perf_counter() - t, nbytes(kwargs.get("data")))
+        return out
+
+
+def summary_frame(s):
+    # Ringkasan -> tabel untuk panel debug
+    import pandas as pd
+    rows = [{"jenis": kind, "nama": name, "n": v["n"], "ms": v["ms"], "bytes": v["bytes"]}
+            for kind in ("section", "helper", "backend") for name, v in s.get(kind, {}).items()]
+    return pd.DataFrame(rows, columns=["jenis", "nama", "n", "ms", "bytes"])
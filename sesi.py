@@ -0,0 +1,49 @@
+import base64
+import hashlib
+import hmac
+import secrets
+import threading
+import time
+
+# --- TOKEN SESI BERTANDA TANGAN (HMAC-SHA256) ---
+# Disimpan di URL (?s=...), sehingga reconnect / refresh yang diarahkan load balancer ke worker lain
+# tetap login tanpa state bersama. Isi token: username + waktu kedaluwarsa + nonce; secret sama di semua worker.
+# Nonce membuat tiap token unik, jadi token hasil rotasi tidak ikut tercabut bersama token lama (detik yang sama).
+
+def _b64(raw):
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def _unb64(txt):
+    return base64.urlsafe_b64decode(txt + '=' * (-len(txt) % 4))
+
+def _sign(payload, secret):
+    return _b64(hmac.new(secret.encode(), payload.encode(), hashlib.sha256).digest())
+
+def make_token(username, secret, ttl):
+    payload = _b64(f"{username}\n{int(time.time() + ttl)}\n{secrets.token_urlsafe(6)}".encode())
+    return f"{payload}.{_sign(payload, secret)}"
+
+def read_token(token, secret):
+    # -> (username, tanda tangan, kedaluwarsa) atau None bila format salah, tanda tangan tidak cocok, atau kedaluwarsa
+    try:
+        payload, sig = str(token).rsplit('.', 1)
+        if not hmac.compare_digest(sig, _sign(payload, secret)): return None
+        username, until, _ = _unb64(payload).decode().rsplit('\n', 2)
+        return (username, sig, int(until)) if time.time() < int(until) else None
+    except Exception: return None
+
+class LocalRevocations:
+    # Daftar token dicabut (logout) di proses ini saja; dipakai bila tidak ada SharedBus.
+    # API sama dengan SharedBus.revoke / is_revoked; entri dibuang setelah token kedaluwarsa
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._until = {}  # tanda tangan -> kedaluwarsa token
+
+    def revoke(self, sig, until):
+        with self._lock:
+            now = time.time()
+            self._until = {s: u for s, u in self._until.items() if u >= now}
+            self._until[sig] = until
+
+    def is_revoked(self, sig):
+        with self._lock: return sig in self._until
@@ -0,0 +1,1342 @@
+import abc
+import json
+import logging
+import re
+import secrets
+import sqlite3
+import threading
+import time
+import unicodedata
+from bisect import bisect_left, insort
+from collections import namedtuple
+import pandas as pd
+
+log = logging.getLogger("lkpkt.storage")
+
+# --- STORAGE BACKEND ---
+# Semua operasi database di app.py lewat objek Storage, sehingga backend
+# (Google Sheets atau SQLite lokal) bisa dipilih dari konfigurasi.
+
+USER_REFRESH_SECONDS = 10  # jeda minimum baca ulang tabel users saat username tidak dikenal
+
+LOG_COLUMNS = ["user", "tanggal", "waktu", "aktivitas", "hasil", "id", "rev"]
+SHEET_SYNC_COLUMNS = ["rev", "deleted"]  # ditambahkan otomatis ke header sheet lama
+CHANGES_SHEET = "changes"  # sync delta: nomor baris logs yang diubah di tempat, satu per baris (dibuat otomatis)
+
+# Hasil write_batch: id yang tidak ditemukan, id yang bentrok (rev berubah), id insert yang diganti {lama: baru}
+BatchResult = namedtuple("BatchResult", "missing conflicts remapped")
+
+class ConflictError(Exception):
+    # Baris sudah diubah/dihapus sesi lain sejak dibaca (rev tidak cocok)
+    def __init__(self, log_id):
+        super().__init__(f"Data id {log_id} sudah diubah di sesi lain")
+        self.log_id = log_id
+USER_COLUMNS = ["username", "password"]
+
+def empty_logs():
+    return pd.DataFrame(columns=LOG_COLUMNS)
+
+def empty_users():
+    return pd.DataFrame(columns=USER_COLUMNS)
+
+def log_record(user, row, log_id):
+    return {"user": user, "tanggal": str(row['tanggal']), "waktu": row['waktu'], "aktivitas": row['aktivitas'], "hasil": row['hasil'], "id": int(log_id), "rev": 0}
+
+def log_rows(df):
+    # Baris DataFrame logs -> tuple kolom LOG_COLUMNS (nilai Python biasa); jauh lebih cepat dari to_dict('records')
+    df = df.reindex(columns=LOG_COLUMNS)
+    return list(zip(*[df[c].tolist() for c in LOG_COLUMNS]))
+
+def parse_revs(s):
+    # rev di sheet ditulis "N-token" (token untuk verifikasi tulis); yang dibandingkan hanya N
+    num = pd.to_numeric(s, errors='coerce')
+    odd = num.isna() & s.notna()  # hanya sel "N-token" yang perlu regex
+    if odd.any(): num[odd] = pd.to_numeric(s[odd].astype(str).str.extract(r'^\s*(\d+)', expand=False), errors='coerce')
+    return num.fillna(0).astype(int)
+
+def rev_tag(v):
+    # Tag batch di sel rev: "N-tag" (update/delete) atau "0-tag-id" (insert, id = id saat dikirim); '' = tanpa tag
+    parts = str(v).split('-')
+    return parts[1] if len(parts) > 1 else ''
+
+def escape_formulas(df):
+    # conn.update (gspread_dataframe) menulis USER_ENTERED: teks berawalan = + - @ diberi ' supaya tetap
+    # tersimpan sebagai teks, bukan dijalankan sebagai rumus (Sheets membuang ' itu saat dibaca)
+    return df.map(lambda v: f"'{v}" if isinstance(v, str) and v[:1] in "=+-@" else v)
+
+def is_tombstone(s):
+    return s.astype(str).isin(['1', '1.0', 'True', 'TRUE'])
+
+def normalize_logs(df):
+    # Bentuk baku tabel logs di memori: id int, tanggal 'YYYY-MM-DD', baris kosong dibuang
+    if df is None or 'id' not in df.columns: return empty_logs()
+    df = df.dropna(how='all')
+    if 'deleted' in df.columns: df = df[~is_tombstone(df['deleted'])]  # tombstone
+    df = df.reindex(columns=LOG_COLUMNS)
+    df['rev'] = parse_revs(df['rev'])
+    df['id'] = pd.to_numeric(df['id'], errors='coerce')
+    df = df[df['id'].notna()].astype({'id': int})
+    tgl = pd.to_datetime(df['tanggal'], errors='coerce')
+    df['tanggal'] = tgl.dt.strftime('%Y-%m-%d').where(tgl.notna(), df['tanggal'].astype(str))
+    return df.reset_index(drop=True)
+
+LOG_FIELDS = ["tanggal", "waktu", "aktivitas", "hasil"]  # kolom yang boleh diubah lewat update
+
+def log_fields(tanggal, waktu, aktivitas, hasil):
+    return {"tanggal": str(tanggal), "waktu": waktu, "aktivitas": aktivitas, "hasil": hasil}
+
+def coalesce_ops(ops):
+    # Gabungkan antrian operasi ('insert', id, rec) / ('update', id, fields, rev) / ('delete', id, rev)
+    # menjadi keadaan akhir per id, supaya satu batch cukup 1x append + 1x update.
+    # `expected` = rev yang dilihat user sebelum perubahan pertama (None = tanpa cek konflik)
+    inserts, updates, deletes, expected = {}, {}, set(), {}
+    for op in ops:
+        kind, log_id = op[0], int(op[1])
+        if kind == 'insert': inserts[log_id] = dict(op[2]); continue
+        if log_id not in inserts and log_id not in expected: expected[log_id] = op[3] if len(op) > 3 else None
+        if kind == 'update':
+            if log_id in inserts: inserts[log_id].update(op[2])
+            else: updates.setdefault(log_id, {}).update(op[2])
+        elif kind == 'delete':
+            updates.pop(log_id, None)
+            if inserts.pop(log_id, None) is None: deletes.add(log_id)
+    return inserts, updates, deletes, expected
+
+def apply_ops(df, inserts, updates, deletes):
+    # Versi pandas dari write_batch, untuk fallback tulis ulang seluruh sheet
+    df = df.copy()
+    df['id'] = pd.to_numeric(df['id'], errors='coerce')
+    df['rev'] = parse_revs(df['rev']) if 'rev' in df.columns else 0  # kolom teks dari sheet -> int sebelum +1
+    for log_id, fields in updates.items():
+        mask = df['id'] == log_id
+        for col, val in fields.items(): df.loc[mask, col] = val
+        df.loc[mask, 'rev'] = parse_revs(df.loc[mask, 'rev']) + 1
+    df = df[~df['id'].isin(deletes)]
+    if inserts: df = pd.concat([df, pd.DataFrame(list(inserts.values()))], ignore_index=True)
+    return df
+
+# --- PENCARIAN TEKS (aktivitas + hasil) ---
+# Kata = huruf/angka, huruf kecil, tanpa diakritik: sama dengan tokenizer unicode61 FTS5 di SQLite
+WORD_RE = re.compile(r'[^\W_]+')
+
+def text_tokens(*texts):
+    s = ' '.join(t for t in texts if isinstance(t, str)).casefold()
+    if not s.isascii(): s = ''.join(c for c in unicodedata.normalize('NFKD', s) if not unicodedata.combining(c))
+    return WORD_RE.findall(s)
+
+def search_terms(query):
+    # Kata kunci unik sesuai urutan; setiap kata dicocokkan sebagai awalan (prefix), semua harus ada (AND)
+    return list(dict.fromkeys(text_tokens(query or '')))
+
+class TextIndex:
+    # Inverted index kata -> set id, kosakata terurut untuk pencarian awalan (bisect)
+    def __init__(self, ids=(), aktivitas=(), hasil=()):
+        self.postings = {}
+        for log_id, a, h in zip(ids, aktivitas, hasil):
+            for t in text_tokens(a, h): self.postings.setdefault(t, set()).add(log_id)
+        self.vocab = sorted(self.postings)
+
+    def add(self, log_id, *texts):
+        for t in text_tokens(*texts):
+            if t not in self.postings: self.postings[t] = set(); insort(self.vocab, t)
+            self.postings[t].add(log_id)
+
+    def remove(self, log_id, *texts):
+        for t in text_tokens(*texts): self.postings.get(t, set()).discard(log_id)
+
+    def match(self, terms):
+        found = None
+        for term in terms:
+            hit, i = set(), bisect_left(self.vocab, term)
+            while i < len(self.vocab) and self.vocab[i].startswith(term): hit |= self.postings[self.vocab[i]]; i += 1
+            found = hit if found is None else found & hit
+            if not found: return set()
+        return found or set()
+
+def slot_bits(taken, slots):
+    # Bitmap slot terisi: bit i = slots[i] sudah dipakai
+    return sum(1 << i for i, slot in enumerate(slots) if slot in taken)
+
+def next_id(ids):
+    ids = pd.to_numeric(pd.Series(ids, dtype=object), errors='coerce')
+    return int(ids.max()) + 1 if ids.notna().any() else 1
+
+
+class Storage(abc.ABC):
+    # PERBAIKAN: ABC -> backend yang lupa salah satu operasi dasar gagal saat dibuat, bukan di tengah request
+    version = None  # nomor versi data; None = backend tidak melacak versi
+    bus = None      # SharedBus bila beberapa worker memakai data yang sama
+
+    @abc.abstractmethod
+    def load_logs(self): ...
+    @abc.abstractmethod
+    def load_users(self): ...
+    @abc.abstractmethod
+    def append_logs(self, user, rows): ...   # -> list id baru (1 blok berurutan)
+    @abc.abstractmethod
+    def add_users(self, rows): ...
+    @abc.abstractmethod
+    def write_batch(self, ops, tag=None): ...  # -> BatchResult; tag sama = percobaan ulang batch yang sama
+
+    def restore_logs(self, df):
+        # Restore snapshot (DataFrame LOG_COLUMNS) dengan id aslinya; id yang sudah ada dilewati ->
+        # upload ulang tidak menggandakan. -> jumlah baris yang masuk
+        new = df[~df['id'].isin(normalize_logs(self.load_logs())['id'])]
+        if not new.empty: self.write_batch([('insert', t[5], dict(zip(LOG_COLUMNS, t))) for t in log_rows(new)])
+        return len(new)
+
+    def update_log(self, log_id, tanggal, waktu, aktivitas, hasil, rev=None):
+        # rev = versi baris saat dibaca user; jika sudah berubah -> ConflictError (tidak menimpa perubahan orang lain)
+        res = self.write_batch([('update', log_id, log_fields(tanggal, waktu, aktivitas, hasil), rev)])
+        if int(log_id) in res.conflicts: raise ConflictError(log_id)
+        return int(log_id) not in res.missing
+
+    def delete_log(self, log_id, rev=None):
+        res = self.write_batch([('delete', log_id, rev)])
+        if int(log_id) in res.conflicts: raise ConflictError(log_id)
+        return int(log_id) not in res.missing
+
+    def write_status(self, user):
+        return 0, []  # (jumlah perubahan menunggu, daftar perubahan gagal)
+
+    def create_user(self, username, password):
+        users = self.load_users()
+        if not users.empty and username in users['username'].values: return False
+        self.add_users([{"username": username, "password": password}])
+        return True
+
+    def password_hash(self, username):
+        users = self.load_users()
+        if users.empty or 'username' not in users.columns: return None
+        match = users.loc[users['username'] == username, 'password']
+        return None if match.empty else match.iloc[0]
+
+    def user_logs(self, user):
+        # Backend yang tidak bisa filter di server: ambil subset user saja, sisa kerja sebanding jumlah log user itu
+        df = self.load_logs()
+        if df.empty or 'user' not in df.columns: return empty_logs()
+        return df[df['user'] == user]
+
+    def query_logs(self, user, start_date, end_date):
+        df = self.user_logs(user)
+        if df.empty: return empty_logs()
+        tgl = pd.to_datetime(df['tanggal']).dt.date
+        df = df[(tgl >= start_date) & (tgl <= end_date)]
+        return df.sort_values(by=['tanggal', 'waktu'], ascending=[False, True])
+
+    def search_logs(self, user, start_date, end_date, query):
+        # Tanpa index teks: saring hasil query_logs kata per kata (semua kata kunci harus ada sebagai awalan)
+        df, terms = self.query_logs(user, start_date, end_date), search_terms(query)
+        if not terms or df.empty: return df
+        kata = [text_tokens(a, h) for a, h in zip(df['aktivitas'].tolist(), df['hasil'].tolist())]
+        return df[[all(any(t.startswith(q) for t in ts) for q in terms) for ts in kata]]
+
+    def count_logs(self, user, tanggal):
+        df = self.user_logs(user)
+        if df.empty: return 0
+        return int((df['tanggal'].astype(str) == str(tanggal)).sum())
+
+    def slot_mask(self, user, tanggal, slots):
+        df = self.user_logs(user)
+        if df.empty: return 0
+        return slot_bits(set(df.loc[df['tanggal'].astype(str) == str(tanggal), 'waktu']), slots)
+
+
+SheetLayout = namedtuple("SheetLayout", "ws header row_of rev_of all_ids dead_of tag_of")
+
+class GSheetsStorage(Storage):
+    def __init__(self, conn_factory, changelog=False):
+        self._conn_factory = conn_factory
+        self.changelog = changelog  # True (sync delta): baris yang diubah di tempat dicatat ke CHANGES_SHEET
+        self._conn = None
+        self._book, self._worksheets = None, {}
+        self._lock = threading.RLock()  # satu koneksi dipakai bersama sesi & thread penulis
+        # Header logs, baris data terakhir & id tertinggi (termasuk tombstone) yang sudah dilihat proses ini.
+        # Append cukup memakai ini + jendela baris baru; None = belum tahu -> sekali scan kolom id
+        self._header = self._end = self._top = None
+        self._pending = {}  # tag batch yang gagal di tahap append (mungkin sudah masuk) -> self._end sebelum append
+
+    @property
+    def conn(self):
+        # Koneksi dibuat sekali lalu dipakai ulang (juga dari thread latar tanpa konteks Streamlit)
+        if self._conn is None: self._conn = self._conn_factory()
+        return self._conn
+
+    def _worksheet(self, name):
+        # Worksheet gspread mentah, di-cache supaya spreadsheet tidak dibuka ulang setiap operasi.
+        # PERBAIKAN: lewat API publik gspread (conn.spreadsheet() -> Spreadsheet.worksheet), bukan client privat st-gsheets
+        if name not in self._worksheets:
+            if self._book is None: self._book = self.conn.spreadsheet()
+            self._worksheets[name] = self._book.worksheet(name)
+        return self._worksheets[name]
+
+    def _log_header(self, ws, fresh=True):
+        # Header logs (kolom SHEET_SYNC_COLUMNS ditambahkan bila belum ada); fresh=False -> pakai yang tersimpan
+        from gspread.utils import rowcol_to_a1
+        if self._header and not fresh: return self._header
+        header = ws.row_values(1)
+        if 'id' not in header: raise KeyError("kolom id tidak ada")
+        extra = [c for c in SHEET_SYNC_COLUMNS if c not in header]
+        if extra:
+            if ws.col_count < len(header) + len(extra): ws.add_cols(len(header) + len(extra) - ws.col_count)
+            ws.update(range_name=rowcol_to_a1(1, len(header) + 1), values=[extra])
+            header = header + extra
+        self._header = header
+        return header
+
+    def _col_letter(self, header, name):
+        from gspread.utils import rowcol_to_a1
+        return re.sub(r'\d', '', rowcol_to_a1(1, header.index(name) + 1))
+
+    def _scan_ids(self):
+        # Sekali per proses (atau setelah sheet ditulis ulang): seluruh kolom id -> baris terakhir & id tertinggi
+        ws = self._worksheet("logs"); header = self._log_header(ws, fresh=False)
+        col = ws.col_values(header.index('id') + 1)[1:]
+        self._end, self._top = len(col) + 1, next_id(col) - 1
+
+    def _logs_layout(self):
+        # Header + posisi baris, rev & tombstone tiap id: 1 request untuk header, 1 batch_get untuk 3 kolom
+        ws = self._worksheet("logs")
+        header = self._log_header(ws)
+        letters = [self._col_letter(header, c) for c in ('id', 'rev', 'deleted')]
+        cols = [[r[0] if r else '' for r in vr] for vr in ws.batch_get([f"{l}2:{l}" for l in letters])]
+        n = len(cols[0])
+        t = pd.DataFrame({k: pd.Series((c + [''] * n)[:n], dtype=object) for k, c in zip(('id', 'rev', 'deleted'), cols)})
+        t['row'] = range(2, n + 2)
+        t['id'] = pd.to_numeric(t['id'], errors='coerce')
+        t = t.dropna(subset=['id']).astype({'id': int})
+        self._end, self._top = n + 1, max(t['id'], default=0)
+        gone = is_tombstone(t['deleted']); live, dead = t[~gone], t[gone & ~t['id'].isin(t.loc[~gone, 'id'])]
+        return SheetLayout(ws, header, dict(zip(live['id'], live['row'])), dict(zip(live['id'], parse_revs(live['rev']))), set(t['id']),
+                           dict(zip(dead['id'], zip(dead['row'], parse_revs(dead['rev'])))), dict(zip(t['id'], t['rev'].map(rev_tag))))
+
+    def load_logs(self):
+        with self._lock: df = self.conn.read(worksheet="logs", ttl=0)
+        if 'deleted' in df.columns: df = df[~is_tombstone(df['deleted'])]
+        return df
+
+    def load_users(self):
+        with self._lock: return self.conn.read(worksheet="users", ttl=0)
+
+    def append_logs(self, user, rows):
+        # Append-only: semua baris baru dikirim dalam 1 request. PERBAIKAN: id diambil dari id tertinggi yang
+        # sudah dilihat proses ini (termasuk tombstone -> tidak pernah dipakai ulang), tanpa membaca kolom
+        # apa pun; bentrok dengan proses lain dicek di jendela baris baru saja (_append_checked)
+        if not rows: return []
+        with self._lock:
+            try:
+                if self._top is None: self._scan_ids()
+                new_id = self._top + 1
+            except Exception:
+                df_logs = self.load_logs()
+                new_id = next_id(df_logs['id']) if 'id' in df_logs.columns else 1
+            recs = [log_record(user, r, new_id + i) for i, r in enumerate(rows)]
+            res = self.write_batch([('insert', rec['id'], rec) for rec in recs])
+        return [res.remapped.get(rec['id'], rec['id']) for rec in recs]
+
+    def write_batch(self, ops, tag=None, *, layout=None):
+        # PERBAIKAN: `tag` ditulis ke sel rev. BackgroundWriter memakai tag yang sama di setiap percobaan ulang,
+        # jadi operasi yang sudah masuk di percobaan sebelumnya (request gagal setelah sampai di server)
+        # dikenali dari tag-nya: tidak di-append dua kali dan tidak dilaporkan sebagai konflik
+        from gspread.utils import rowcol_to_a1
+        inserts, updates, deletes, expected = coalesce_ops(ops)
+        touched = set(updates) | deletes
+        with self._lock:
+            try:
+                lay = layout or (self._logs_layout() if touched else None)  # insert saja: posisi baris tidak perlu
+                if inserts and self._top is None: self._scan_ids()
+            except Exception: return self._rewrite_batch(inserts, updates, deletes, expected)
+            if not touched: return BatchResult(set(), set(), self._append_checked(inserts, tag=tag))
+            done = {i for i in touched if tag and lay.tag_of.get(i) == tag}  # sudah ditulis percobaan sebelumnya
+            touched -= done
+            missing = touched - set(lay.row_of)
+            conflicts = {i for i in touched - missing if expected.get(i) is not None and lay.rev_of[i] != int(expected[i])}
+            # Update & delete per baris (delete = tombstone, jadi nomor baris lain tidak pernah bergeser).
+            # rev ditulis "N-token" supaya penulis yang kalah balapan bisa mendeteksinya saat verifikasi.
+            # PERBAIKAN: semua tulisan sel memakai RAW -> teks user berawalan '=' tetap teks, bukan rumus
+            # PERBAIKAN: update juga menulis deleted='' -> sel 'deleted' & rev selalu ditulis bersama, jadi
+            # batch_update yang mendarat terakhir menentukan keadaan baris (hidup/terhapus) dan hanya dia yang
+            # lolos verifikasi; yang kalah dilaporkan konflik tanpa meninggalkan tombstone/isi setengah jadi
+            written = {}
+            for i in touched - missing - conflicts:
+                fields = {'deleted': 1} if i in deletes else dict(updates[i], deleted='')
+                fields['rev'] = f"{lay.rev_of[i] + 1}-{tag or secrets.token_hex(3)}"
+                written[i] = fields
+            cells = [{"range": rowcol_to_a1(lay.row_of[i], lay.header.index(c) + 1), "values": [[v]]}
+                     for i, f in written.items() for c, v in f.items() if c in lay.header]
+            if cells:
+                lay.ws.batch_update(cells, value_input_option="RAW")
+                conflicts |= self._verify_revs(lay, written)
+            self._log_changes([lay.row_of[i] for i in written] + [lay.row_of.get(i, lay.dead_of.get(i, (None,))[0]) for i in done])
+            remapped = self._append_checked(inserts, tag=tag) if inserts else {}
+        return BatchResult(missing, conflicts, remapped)
+
+    def _verify_revs(self, lay, written):
+        # Baca ulang sel rev yang baru ditulis (1 request); jika berbeda, sesi lain menulis baris yang sama
+        from gspread.utils import rowcol_to_a1
+        col = lay.header.index('rev') + 1
+        ids = list(written)
+        got = lay.ws.batch_get([rowcol_to_a1(lay.row_of[i], col) for i in ids])
+        return {i for i, vr in zip(ids, got) if (vr[0][0] if vr and vr[0] else '') != written[i]['rev']}
+
+    def _append_checked(self, inserts, keep_ids=False, tag=None):
+        # Append lalu cek id ganda dari proses lain yang append bersamaan. Yang barisnya lebih bawah
+        # (kalah cepat) mengganti id-nya dengan id baru, diulang sampai tidak ada bentrok.
+        # PERBAIKAN: yang dibaca hanya jendela baris sesudah baris terakhir yang sudah dilihat (self._end)
+        # sampai baris yang baru di-append -> biaya simpan tetap, tidak tumbuh dengan ukuran sheet.
+        # Id <= id tertinggi yang pernah dilihat diganti id baru, kecuali keep_ids (restore dengan id asli).
+        # Rev baris baru = "0-tag-id": percobaan ulang dengan tag yang sama mencari baris itu di jendela dulu
+        from gspread.utils import rowcol_to_a1
+        ws = self._worksheet("logs"); header = self._log_header(ws, fresh=False)
+        if self._top is None: self._scan_ids()
+        id_col, letter, rev_letter = header.index('id') + 1, self._col_letter(header, 'id'), self._col_letter(header, 'rev')
+        since, retry = self._pending.get(tag, self._end), tag in self._pending
+        start, own, tag = 2 if since is None else since + 1, tag is None, tag or secrets.token_hex(3)
+        landed = {}  # id saat dikirim -> (baris, id di sheet) yang sudah masuk di percobaan sebelumnya
+        if retry:
+            got_ids, got_revs = ws.batch_get([f"{letter}{start}:{letter}", f"{rev_letter}{start}:{rev_letter}"])
+            for r, (i, v) in enumerate(zip(got_ids, got_revs), start=start):
+                parts = str(v[0] if v else '').split('-')
+                if len(parts) == 3 and parts[1] == tag and i: landed[int(parts[2])] = (r, int(i[0]))
+        remapped, top, mine, recs, moved = {}, max([self._top] + list(inserts)), [], [], []
+        for log_id, rec in sorted(inserts.items()):
+            if log_id in landed:
+                row, sid = landed[log_id]; mine.append((log_id, dict(rec, id=sid), row))
+                if sid != log_id: remapped[log_id] = sid
+                continue
+            if log_id <= self._top and not keep_ids: top += 1; remapped[log_id] = top; rec = dict(rec, id=top)
+            recs.append((log_id, dict(rec, rev=f"0-{tag}-{log_id}")))
+        try:
+            if recs:
+                resp = ws.append_rows([[rec.get(c, "") for c in header] for _, rec in recs], value_input_option="RAW", insert_data_option="INSERT_ROWS")
+                m = re.search(r'![A-Z]+(\d+)', str((resp or {}).get('updates', {}).get('updatedRange', '')))
+                if not m: self._end = self._top = None; return remapped  # posisi tidak diketahui -> scan ulang nanti
+                mine += [(orig, rec, int(m.group(1)) + k) for k, (orig, rec) in enumerate(recs)]
+                if since is not None and int(m.group(1)) <= since: start = 2  # sheet menyusut -> cek semua
+            last_row = max(row for _, _, row in mine)
+            for _ in range(5):
+                got = ws.batch_get([f"{letter}{start}:{letter}{last_row}"])[0]
+                ids = pd.to_numeric(pd.Series([r[0] if r else '' for r in got], dtype=object), errors='coerce')
+                first_seen = {}
+                for r, v in zip(range(start, last_row + 1), ids):
+                    if pd.notna(v): first_seen.setdefault(int(v), r)
+                top = max([top] + ids.dropna().astype(int).tolist())
+                cells = []
+                for orig, rec, row in mine:
+                    if first_seen.get(int(rec['id']), row) < row:
+                        moved += [row, first_seen[int(rec['id'])]]  # pembaca delta bisa saja sempat melihat id ganda
+                        top += 1; rec['id'] = top; remapped[orig] = top
+                        cells.append({"range": rowcol_to_a1(row, id_col), "values": [[top]]})
+                if not cells: break
+                ws.batch_update(cells, value_input_option="RAW")
+        except Exception:
+            # Request gagal bisa saja sudah masuk: catat tag supaya percobaan ulang mencari barisnya dulu.
+            # Tidak dihapus saat berhasil: aksi tiap user dari batch yang gagal bisa dicoba ulang terpisah
+            if not own: self._pending.setdefault(tag, since)
+            raise
+        self._end, self._top = max(self._end or 0, last_row), top
+        self._log_changes(moved)
+        return remapped
+
+    def restore_logs(self, df):
+        # Id yang masih hidup dilewati; id yang pernah dihapus (tombstone) dihidupkan lagi di barisnya sendiri
+        # (1 batch_update), sisanya di-append dengan id aslinya (1 append_rows)
+        from gspread.utils import rowcol_to_a1
+        with self._lock:
+            try: lay = self._logs_layout()
+            except Exception: return super().restore_logs(df)
+            todo = {t[5]: dict(zip(LOG_COLUMNS, t)) for t in log_rows(df[~df['id'].isin(list(lay.row_of))])}
+            n, cells, revived = len(todo), [], []
+            for i in [i for i in todo if i in lay.dead_of]:
+                row, rev = lay.dead_of[i]; revived.append(row)
+                rec = dict(todo.pop(i), deleted='', rev=f"{rev + 1}-{secrets.token_hex(3)}")
+                cells += [{"range": rowcol_to_a1(row, lay.header.index(c) + 1), "values": [[v]]} for c, v in rec.items() if c in lay.header]
+            if cells: lay.ws.batch_update(cells, value_input_option="RAW"); self._log_changes(revived)
+            if todo: self._append_checked(todo, keep_ids=True)
+        return n
+
+    def _changes_ws(self):
+        from gspread.exceptions import WorksheetNotFound
+        try: return self._worksheet(CHANGES_SHEET)
+        except WorksheetNotFound:
+            try: self._book.add_worksheet(CHANGES_SHEET, rows=1, cols=1)
+            except Exception: pass  # dibuat proses lain bersamaan -> dibuka di bawah
+            return self._worksheet(CHANGES_SHEET)
+
+    def _log_changes(self, rows):
+        # Catat nomor baris yang diubah di tempat (update, delete, id diganti, tombstone dihidupkan) -> 1 append.
+        # Baris baru tidak perlu dicatat: pembaca delta membaca semua baris sesudah baris terakhir yang ia lihat.
+        # Gagal mencatat tidak menggagalkan tulisan yang sudah masuk: pembaca tertinggal sampai rekonsiliasi penuh
+        rows = sorted({int(r) for r in rows if r})
+        if not self.changelog or not rows: return
+        try: self._changes_ws().append_rows([[r] for r in rows], value_input_option="RAW", insert_data_option="INSERT_ROWS")
+        except Exception: log.warning("catatan perubahan baris %s gagal ditulis", rows, exc_info=True)
+
+    def change_marks(self):
+        # Titik awal sync delta: (baris data terakhir, id di baris itu, jumlah catatan perubahan). Dibaca sebelum
+        # rekonsiliasi penuh -> perubahan di sela keduanya ikut terambil lagi di sync berikutnya (upsert, aman)
+        from gspread.exceptions import WorksheetNotFound
+        with self._lock:
+            ws = self._worksheet("logs"); header = self._log_header(ws)
+            col = ws.col_values(header.index('id') + 1)
+            try: seen = len(self._worksheet(CHANGES_SHEET).col_values(1))
+            except WorksheetNotFound: seen = 0
+        return [len(col), col[-1] if len(col) > 1 else '', seen]
+
+    def read_changes(self, end, end_id, seen):
+        # Sync delta dari titik change_marks(): catatan perubahan sesudah catatan ke-`seen` (1 request), lalu baris
+        # sesudah `end` + baris yang tercatat berubah (1 batch_get). Baris `end` ikut dibaca: bila isinya bukan lagi
+        # `end_id`, baris sheet bergeser (dihapus/diurutkan manual) -> None, pemanggil rekonsiliasi penuh.
+        # -> (baris mentah termasuk tombstone, [end, end_id, seen] baru)
+        from gspread.exceptions import WorksheetNotFound
+        with self._lock:
+            try: marks = self._worksheet(CHANGES_SHEET).batch_get([f"A{seen + 1}:A"])[0]
+            except WorksheetNotFound: marks = []
+            ws = self._worksheet("logs"); header = self._log_header(ws, fresh=False)
+            w, last, start = len(header), self._col_letter(header, header[-1]), max(end, 2)
+            spans = []
+            for r in sorted({int(m[0]) for m in marks if m and str(m[0]).isdigit()}):
+                if not 1 < r < start: continue  # baris sesudah `end` sudah ikut dibaca
+                if spans and r == spans[-1][1] + 1: spans[-1][1] = r
+                else: spans.append([r, r])
+            got = ws.batch_get([f"A{start}:{last}"] + [f"A{a}:{last}{b}" for a, b in spans])
+        tail = [(r + [''] * w)[:w] for r in got[0]]
+        id_col = header.index('id')
+        if end >= 2 and (not tail or str(tail[0][id_col]) != str(end_id)): return None
+        values = tail + [(r + [''] * w)[:w] for vr in got[1:] for r in vr]
+        if tail: end, end_id = start + len(tail) - 1, tail[-1][id_col]
+        return pd.DataFrame(values, columns=header).replace('', None), [end, end_id, seen + len(marks)]
+
+    def _rewrite_batch(self, inserts, updates, deletes, expected):
+        # Fallback: sheet kosong / koneksi publik tanpa akses gspread -> tulis ulang seluruh sheet
+        self._header = self._end = self._top = None  # posisi baris berubah -> scan ulang di append berikutnya
+        df_logs = self.load_logs()
+        if 'id' not in df_logs.columns: df_logs = empty_logs()
+        ids = pd.to_numeric(df_logs['id'], errors='coerce')
+        revs = dict(zip(ids, parse_revs(df_logs['rev']) if 'rev' in df_logs.columns else [0] * len(ids)))
+        touched = set(updates) | deletes
+        missing = touched - set(revs)
+        conflicts = {i for i in touched - missing if expected.get(i) is not None and revs[i] != int(expected[i])}
+        updates = {i: f for i, f in updates.items() if i not in missing | conflicts}
+        self.conn.update(worksheet="logs", data=escape_formulas(apply_ops(df_logs, inserts, updates, deletes - conflicts)))
+        return BatchResult(missing, conflicts, {})
+
+    def add_users(self, rows):
+        with self._lock:
+            df_users = self.load_users()
+            if 'username' not in df_users.columns: df_users = empty_users()
+            self.conn.update(worksheet="users", data=escape_formulas(pd.concat([df_users, pd.DataFrame(rows)], ignore_index=True)))
+
+
+FTS_TRIGGERS = {
+    "logs_fts_ai": """CREATE TRIGGER IF NOT EXISTS logs_fts_ai AFTER INSERT ON logs BEGIN
+        INSERT INTO logs_fts(rowid, aktivitas, hasil) VALUES (new.id, new.aktivitas, new.hasil);
+    END""",
+    "logs_fts_ad": """CREATE TRIGGER IF NOT EXISTS logs_fts_ad AFTER DELETE ON logs BEGIN
+        INSERT INTO logs_fts(logs_fts, rowid, aktivitas, hasil) VALUES ('delete', old.id, old.aktivitas, old.hasil);
+    END""",
+    "logs_fts_au": """CREATE TRIGGER IF NOT EXISTS logs_fts_au AFTER UPDATE OF aktivitas, hasil ON logs BEGIN
+        INSERT INTO logs_fts(logs_fts, rowid, aktivitas, hasil) VALUES ('delete', old.id, old.aktivitas, old.hasil);
+        INSERT INTO logs_fts(rowid, aktivitas, hasil) VALUES (new.id, new.aktivitas, new.hasil);
+    END""",
+}
+
+class SQLiteStorage(Storage):
+    # Backend lokal (kegiatan.db): offline, latensi milidetik, query pakai index
+    def __init__(self, path="kegiatan.db"):
+        self.path = path
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._db.executescript("""
+                CREATE TABLE IF NOT EXISTS logs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user TEXT,
+                    tanggal DATE,
+                    waktu TEXT,
+                    aktivitas TEXT,
+                    hasil TEXT,
+                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+                );
+                CREATE TABLE IF NOT EXISTS users (
+                    username TEXT PRIMARY KEY,
+                    password TEXT
+                );
+                CREATE INDEX IF NOT EXISTS idx_logs_user_tanggal ON logs(user, tanggal);
+                CREATE TABLE IF NOT EXISTS sync_state (
+                    key TEXT PRIMARY KEY,
+                    value TEXT
+                );
+            """)
+            # Migrasi: kolom rev untuk optimistic concurrency
+            if 'rev' not in [r[1] for r in self._db.execute("PRAGMA table_info(logs)")]:
+                self._db.execute("ALTER TABLE logs ADD COLUMN rev INTEGER DEFAULT 0")
+            self._fts = self._init_fts()
+
+    def _init_fts(self):
+        # Index teks FTS5 (external content = tabel logs), dijaga trigger -> ikut bertambah setiap tulis.
+        # recursive_triggers: INSERT OR REPLACE (apply_snapshot) ikut menjalankan trigger hapus.
+        # SQLite tanpa FTS5 -> False, pencarian memakai saringan biasa.
+        try:
+            baru = self._db.execute("SELECT 1 FROM sqlite_master WHERE name='logs_fts'").fetchone() is None
+            self._db.execute("PRAGMA recursive_triggers = ON")
+            self._db.execute("""CREATE VIRTUAL TABLE IF NOT EXISTS logs_fts USING fts5(
+                aktivitas, hasil, content='logs', content_rowid='id', tokenize='unicode61 remove_diacritics 2', prefix='2 3')""")
+            for sql in FTS_TRIGGERS.values(): self._db.execute(sql)
+            if baru: self._db.execute("INSERT INTO logs_fts(logs_fts) VALUES ('rebuild')")  # database lama: index dibangun sekali
+            return True
+        except sqlite3.OperationalError:
+            return False
+
+    def _fts_pause(self, n, replace_all=False):
+        # Dipanggil di dalam transaksi tulis massal: trigger per baris ~10x lebih lambat daripada membangun
+        # ulang index sekali, jadi bila yang ditulis > 10% tabel trigger dilepas lalu _fts_resume() me-rebuild.
+        # Rollback ikut mengembalikan trigger (DDL SQLite transaksional).
+        if not self._fts: return False
+        if not replace_all and n * 10 <= (self._db.execute("SELECT MAX(id) FROM logs").fetchone()[0] or 0): return False
+        for name in FTS_TRIGGERS: self._db.execute(f"DROP TRIGGER IF EXISTS {name}")
+        return True
+
+    def _fts_resume(self):
+        self._db.execute("INSERT INTO logs_fts(logs_fts) VALUES ('rebuild')")
+        for sql in FTS_TRIGGERS.values(): self._db.execute(sql)
+
+    def _read(self, sql, params=()):
+        with self._lock: return pd.read_sql_query(sql, self._db, params=params)
+
+    def _write(self, sql, params=(), many=False):
+        with self._lock:
+            cur = self._db.executemany(sql, params) if many else self._db.execute(sql, params)
+            return cur.rowcount
+
+    def load_logs(self):
+        return self._read("SELECT user, tanggal, waktu, aktivitas, hasil, id, rev FROM logs ORDER BY id")
+
+    def load_users(self):
+        return self._read("SELECT username, password FROM users")
+
+    def _last_id(self):
+        # id terakhir yang pernah dipakai (sqlite_sequence ikut menghitung id yang sudah dihapus)
+        return self._db.execute("SELECT MAX(COALESCE((SELECT seq FROM sqlite_sequence WHERE name='logs'), 0), COALESCE((SELECT MAX(id) FROM logs), 0))").fetchone()[0]
+
+    def append_logs(self, user, rows):
+        if not rows: return []
+        with self._lock:
+            # BEGIN IMMEDIATE: alokasi blok id + insert atomik, aman walau beberapa proses memakai file yang sama
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                last = self._last_id()
+                recs = [log_record(user, r, last + 1 + i) for i, r in enumerate(rows)]
+                self._db.executemany("INSERT INTO logs (id, user, tanggal, waktu, aktivitas, hasil, rev) VALUES (:id, :user, :tanggal, :waktu, :aktivitas, :hasil, :rev)", recs)
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK"); raise
+        return [rec['id'] for rec in recs]
+
+    def write_batch(self, ops, tag=None):
+        # tag tidak dipakai: satu transaksi, jadi batch yang gagal tidak pernah masuk sebagian
+        inserts, updates, deletes, expected = coalesce_ops(ops)
+        missing, conflicts, remapped = set(), set(), {}
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                # id hasil alokasi optimistic (dari cache) yang sudah pernah dikeluarkan -> ganti id baru. Dibandingkan
+                # dengan sqlite_sequence, bukan baris yang masih ada: id yang sudah dihapus juga tidak dipakai ulang
+                # (allocator hanya maju; restore backup berbasis id tidak tertukar dengan baris baru)
+                if inserts:
+                    last = self._last_id()
+                    top = max([last] + list(inserts))
+                    for log_id in sorted(i for i in inserts if i <= last):
+                        top += 1; remapped[log_id] = top
+                    recs = [dict(rec, id=remapped.get(i, i), rev=0) for i, rec in inserts.items()]
+                    self._db.executemany("INSERT INTO logs (id, user, tanggal, waktu, aktivitas, hasil, rev) VALUES (:id, :user, :tanggal, :waktu, :aktivitas, :hasil, :rev)", recs)
+                # compare-and-swap: WHERE rev = rev yang dilihat user
+                for log_id, fields in updates.items():
+                    cols = [c for c in LOG_FIELDS if c in fields]
+                    cur = self._db.execute(f"UPDATE logs SET {', '.join(c + '=?' for c in cols)}, rev=rev+1, timestamp=CURRENT_TIMESTAMP WHERE id=? AND (? IS NULL OR rev=?)",
+                                           [fields[c] for c in cols] + [log_id, expected.get(log_id), expected.get(log_id)])
+                    if cur.rowcount == 0: (conflicts if self._exists(log_id) else missing).add(log_id)
+                for log_id in deletes:
+                    cur = self._db.execute("DELETE FROM logs WHERE id=? AND (? IS NULL OR rev=?)", (log_id, expected.get(log_id), expected.get(log_id)))
+                    if cur.rowcount == 0: (conflicts if self._exists(log_id) else missing).add(log_id)
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK"); raise
+        return BatchResult(missing, conflicts, remapped)
+
+    def restore_logs(self, df):
+        # INSERT OR IGNORE dengan id asli: id yang sudah ada dilewati, id yang pernah dihapus masuk lagi
+        # PERBAIKAN: id yang sudah ada dibuang dulu -> upload ulang tidak me-rebuild index FTS seluruh tabel
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                df = df[~df['id'].isin([r[0] for r in self._db.execute("SELECT id FROM logs")])]
+                if df.empty: self._db.execute("COMMIT"); return 0
+                bulk = self._fts_pause(len(df))
+                n = self._db.executemany(f"INSERT OR IGNORE INTO logs ({', '.join(LOG_COLUMNS)}) VALUES ({', '.join('?' * len(LOG_COLUMNS))})", log_rows(df)).rowcount
+                if bulk: self._fts_resume()
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK"); raise
+        return n
+
+    # --- dipakai DeltaSyncStorage saat file ini menjadi snapshot lokal sheet ---
+    def log_tuples(self, ids):
+        # Baris tersimpan (tuple LOG_COLUMNS) untuk id tertentu -> sync delta hanya menulis yang benar-benar berubah
+        sql = f"SELECT {', '.join(LOG_COLUMNS)} FROM logs WHERE id IN (SELECT value FROM json_each(?))"
+        with self._lock: return set(self._db.execute(sql, (json.dumps([int(i) for i in ids]),)).fetchall())
+
+    def get_state(self, key, default=None):
+        with self._lock: row = self._db.execute("SELECT value FROM sync_state WHERE key=?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def apply_snapshot(self, df, delete_ids=(), replace_all=False, state=None):
+        # Satu transaksi: (kosongkan) -> hapus id -> upsert baris -> simpan watermark
+        recs = log_rows(df)
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                bulk = self._fts_pause(len(recs) + len(delete_ids), replace_all)
+                if replace_all: self._db.execute("DELETE FROM logs")
+                self._db.executemany("DELETE FROM logs WHERE id=?", [(int(i),) for i in delete_ids])
+                self._db.executemany(f"INSERT OR REPLACE INTO logs ({', '.join(LOG_COLUMNS)}) VALUES ({', '.join('?' * len(LOG_COLUMNS))})", recs)
+                if bulk: self._fts_resume()
+                self._db.executemany("INSERT OR REPLACE INTO sync_state (key, value) VALUES (?, ?)", [(k, str(v)) for k, v in (state or {}).items()])
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK"); raise
+
+    def _exists(self, log_id):
+        return self._db.execute("SELECT 1 FROM logs WHERE id=?", (log_id,)).fetchone() is not None
+
+    def add_users(self, rows):
+        self._write("INSERT OR IGNORE INTO users (username, password) VALUES (:username, :password)", rows, many=True)
+
+    def create_user(self, username, password):
+        return self._write("INSERT OR IGNORE INTO users (username, password) VALUES (?, ?)", (username, password)) > 0
+
+    def query_logs(self, user, start_date, end_date):
+        return self._read("SELECT user, tanggal, waktu, aktivitas, hasil, id, rev FROM logs WHERE user=? AND tanggal BETWEEN ? AND ? ORDER BY tanggal DESC, waktu ASC", (user, str(start_date), str(end_date)))
+
+    def user_logs(self, user):
+        return self._read("SELECT user, tanggal, waktu, aktivitas, hasil, id, rev FROM logs WHERE user=?", (user,))
+
+    def search_logs(self, user, start_date, end_date, query):
+        terms = search_terms(query)
+        if not terms: return self.query_logs(user, start_date, end_date)
+        if not self._fts: return super().search_logs(user, start_date, end_date, query)
+        # Subquery IN: MATCH dijalankan sekali (bentuk JOIN membuat SQLite mencocokkan per baris -> detik)
+        return self._read("SELECT user, tanggal, waktu, aktivitas, hasil, id, rev FROM logs WHERE user=? AND tanggal BETWEEN ? AND ? "
+                          "AND id IN (SELECT rowid FROM logs_fts WHERE logs_fts MATCH ?) ORDER BY tanggal DESC, waktu ASC",
+                          (user, str(start_date), str(end_date), ' '.join(f'"{t}"*' for t in terms)))
+
+    def password_hash(self, username):
+        with self._lock: row = self._db.execute("SELECT password FROM users WHERE username=?", (username,)).fetchone()
+        return row[0] if row else None
+
+    def count_logs(self, user, tanggal):
+        with self._lock: return self._db.execute("SELECT COUNT(*) FROM logs WHERE user=? AND tanggal=?", (user, str(tanggal))).fetchone()[0]
+
+    def slot_mask(self, user, tanggal, slots):
+        # Memakai idx_logs_user_tanggal, hanya membaca baris hari itu
+        with self._lock: taken = {r[0] for r in self._db.execute("SELECT DISTINCT waktu FROM logs WHERE user=? AND tanggal=?", (user, str(tanggal)))}
+        return slot_bits(taken, slots)
+
+
+class DeltaSyncStorage(Storage):
+    # Sheets tetap sumber data; semua baca dilayani snapshot SQLite lokal yang disinkron bertahap.
+    # PERBAIKAN: sync delta memakai high-water mark [baris terakhir, id-nya, jumlah catatan di CHANGES_SHEET]:
+    # yang diunduh hanya catatan baru + baris baru + baris yang tercatat berubah (2 request), bukan kolom
+    # id/rev/deleted seluruh sheet. Tombstone dihapus dari snapshot. Edit manual di sheet (tidak tercatat,
+    # termasuk baris yang dihapus manual) tertangkap oleh rekonsiliasi penuh tiap `reconcile` detik, atau
+    # langsung bila baris sheet bergeser.
+    def __init__(self, remote, snapshot, interval=30, reconcile=3600):
+        self.remote = remote
+        self.snapshot = snapshot
+        self.interval = interval
+        self.reconcile = reconcile
+        self.version = 0
+        self.last_error = None
+        self._lock = threading.RLock()
+        self._synced_at = 0
+        self._reconciled_at = float(snapshot.get_state("reconciled_at", 0))  # snapshot di disk bertahan antar restart
+        self._marks = json.loads(snapshot.get_state("marks", "null"))  # None -> rekonsiliasi penuh dulu
+
+    def sync(self, force=False):
+        with self._lock:
+            now = time.time()
+            if not force and now - self._synced_at < self.interval: return None
+            try:
+                if self._marks is None or now - self._reconciled_at > self.reconcile: changed = self._reconcile(now)
+                else: changed = self._delta(now)
+                self.last_error = None
+            except Exception as e:
+                # Gagal koneksi: tetap layani snapshot lama, kecuali belum pernah sinkron sama sekali
+                if not self._reconciled_at: raise
+                self.last_error = str(e); changed = 0
+            self._synced_at = now
+            if changed: self.version += 1
+            return changed
+
+    def _delta(self, now):
+        got = self.remote.read_changes(*self._marks)
+        if got is None: return self._reconcile(now)
+        df, marks = got
+        live = normalize_logs(df)
+        dead = set()
+        if 'deleted' in df.columns:
+            dead = set(pd.to_numeric(df.loc[is_tombstone(df['deleted']), 'id'], errors='coerce').dropna().astype(int)) - set(live['id'])
+        rows = log_rows(live)
+        have = self.snapshot.log_tuples([r[5] for r in rows] + list(dead))
+        new, dead = [r for r in rows if r not in have], dead & {r[5] for r in have}
+        self.snapshot.apply_snapshot(pd.DataFrame(new, columns=LOG_COLUMNS), delete_ids=dead, state={"synced_at": now, "marks": json.dumps(marks)})
+        self._marks = marks
+        return len(new) + len(dead)
+
+    def _reconcile(self, now):
+        marks = self.remote.change_marks()
+        df = normalize_logs(self.remote.load_logs())
+        self.snapshot.apply_snapshot(df, replace_all=True, state={"synced_at": now, "reconciled_at": now, "marks": json.dumps(marks)})
+        self._reconciled_at, self._marks = now, marks
+        return len(df) + 1
+
+    def load_logs(self): self.sync(); return self.snapshot.load_logs()
+    def user_logs(self, user): self.sync(); return self.snapshot.user_logs(user)
+    def query_logs(self, user, start_date, end_date): self.sync(); return self.snapshot.query_logs(user, start_date, end_date)
+    def search_logs(self, user, start_date, end_date, query): self.sync(); return self.snapshot.search_logs(user, start_date, end_date, query)
+    def count_logs(self, user, tanggal): self.sync(); return self.snapshot.count_logs(user, tanggal)
+    def slot_mask(self, user, tanggal, slots): self.sync(); return self.snapshot.slot_mask(user, tanggal, slots)
+    def load_users(self): return self.remote.load_users()
+    def add_users(self, rows): return self.remote.add_users(rows)
+
+    def append_logs(self, user, rows):
+        ids = self.remote.append_logs(user, rows)
+        if ids:
+            recs = [log_record(user, r, i) for r, i in zip(rows, ids)]
+            with self._lock: self.snapshot.apply_snapshot(pd.DataFrame(recs, columns=LOG_COLUMNS)); self.version += 1
+        return ids
+
+    def write_batch(self, ops, tag=None):
+        res = self.remote.write_batch(ops, tag=tag)
+        # Terapkan ke snapshot hanya yang berhasil di sheet (rev snapshot ikut naik +1 seperti di sheet)
+        skip = res.missing | res.conflicts
+        local = []
+        for op in ops:
+            if int(op[1]) in skip: continue
+            if op[0] == 'insert':
+                log_id = res.remapped.get(int(op[1]), op[1])
+                local.append(('insert', log_id, dict(op[2], id=log_id)))
+            elif op[0] == 'update': local.append(op[:3])
+            else: local.append(op[:2])
+        with self._lock:
+            self.snapshot.write_batch(local)
+            if skip: self._synced_at = 0  # snapshot baris yang bentrok sudah basi -> sync di baca berikutnya
+            self.version += 1
+        return res
+
+    def restore_logs(self, df):
+        n = self.remote.restore_logs(df)
+        with self._lock: self._synced_at = 0  # baris yang masuk / dihidupkan lagi diambil di sync berikutnya
+        return n
+
+
+class CachedStorage(Storage):
+    # Cache tingkat proses (dipakai bersama semua sesi) untuk tabel logs & users.
+    # Penulisan menambal cache di tempat dan menaikkan `version`, tanpa refetch penuh.
+    # `ttl` (detik) hanya untuk menangkap perubahan dari luar aplikasi (edit manual di sheet).
+    def __init__(self, backend, ttl=None, writer=None, bus=None):
+        self.backend = backend
+        self.ttl = ttl
+        self.writer = writer    # BackgroundWriter: tulis async, cache langsung ditambal (optimistic)
+        self.bus = bus          # SharedBus: event tulis dari/ke worker lain
+        if writer is not None: writer.on_result = self._on_write
+        self._next_id = 1
+        self.version = 0
+        self._gen = 0           # naik setiap frame dimuat ulang dari backend (TTL / bus)
+        self._resent = False    # reload menambal ulang batch yang sedang dikirim -> muat ulang lagi setelah selesai
+        self._lock = threading.RLock()
+        self._frames = None     # user -> DataFrame log milik user itu
+        self._owner = {}        # id -> user
+        self._all = None
+        self._users = None
+        self._passwords = None  # username -> hash
+        self._slots = None      # (user, tanggal) -> {waktu: jumlah log}, dibangun saat pertama dipakai
+        self._text = {}         # user -> TextIndex, dibangun saat user itu pertama kali mencari
+        self._loaded_at = 0
+        self._users_loaded_at = 0
+
+    def _index(self):
+        with self._lock:
+            self._sync_bus()
+            if self._frames is None or (self.ttl and time.time() - self._loaded_at > self.ttl):
+                pending = self._pending_ops()  # diambil sebelum baca: yang selesai di sela baca tetap ditambal
+                df = normalize_logs(self.backend.load_logs())
+                self._frames = {u: g.reset_index(drop=True) for u, g in df.groupby('user', sort=False)}
+                self._owner = dict(zip(df['id'], df['user']))
+                self._all = df; self._slots = None; self._text = {}; self._loaded_at = time.time(); self.version += 1; self._gen += 1
+                self._replay(pending)
+            return self._frames
+
+    def _pending_ops(self, users=None):
+        if self.writer is None: return []
+        return [p for p in self.writer.pending_ops() if users is None or p[0] in users]
+
+    def _replay(self, pending):
+        # PERBAIKAN: mode async, operasi yang masih antre / sedang dikirim belum tentu ada di hasil muat ulang ->
+        # ditambal lagi, supaya baris yang baru disimpan tidak hilang dan slotnya tidak terlihat kosong.
+        # Batch yang sedang dikirim bisa saja sudah masuk (rev naik dua kali) -> _on_write memuat ulang lagi
+        for user, ops, sent in pending:
+            self._resent |= sent
+            for op in ops:
+                if op[0] == 'insert':
+                    # yang masih antre pasti belum masuk (id sama di sheet = milik proses lain, nanti diganti)
+                    if not sent or self._owner.get(int(op[1])) != user: self._patch_insert(user, [op[2]])
+                elif op[0] == 'update': self._patch_update(op[1], op[2])
+                else: self._patch_delete(op[1])
+
+    def _sync_bus(self):
+        # Terapkan perubahan dari worker lain: users -> muat ulang tabel users; logs -> segarkan frame user
+        # yang berubah saja bila backend bisa filter per user (SQLite / snapshot), selain itu muat ulang semua
+        events = self.bus.poll_events() if self.bus is not None else []
+        if not events: return
+        if any(kind in ("users", "all") for kind, _ in events): self._users = None
+        logs = [users for kind, users in events if kind in ("logs", "all")]
+        if not logs: return
+        # PERBAIKAN: backend DeltaSync melayani snapshot lokal yang baru disinkron tiap `interval` detik ->
+        # paksa sync dulu, kalau tidak frame yang disegarkan masih membaca snapshot basi
+        if hasattr(self.backend, 'sync'): self.backend.sync(force=True)
+        if self._frames is None: return
+        changed = set().union(*logs)
+        if not all(logs) or len(changed) > 20 or type(self.backend).user_logs is Storage.user_logs:
+            self._frames = None; self._touch(); return
+        pending = self._pending_ops(changed)
+        for user in changed:
+            old = self._frames.pop(user, empty_logs())
+            for i in old['id']: self._owner.pop(i, None)
+            f = normalize_logs(self.backend.user_logs(user))
+            if not f.empty: self._frames[user] = f; self._owner.update(dict.fromkeys(f['id'], user))
+            if self._slots is not None:
+                for key in [k for k in self._slots if k[0] == user]: del self._slots[key]
+                for (tanggal, waktu), n in f.groupby(['tanggal', 'waktu'], sort=False).size().items(): self._slots.setdefault((user, tanggal), {})[waktu] = int(n)
+            self._text.pop(user, None)
+        self._gen += 1; self._touch()
+        self._replay(pending)
+
+    def _publish(self, kind, users=()):
+        if self.bus is not None: self.bus.publish(kind, users)
+
+    def _slot_index(self):
+        # PERBAIKAN: _index() selalu dipanggil dulu (reload TTL + event bus), baru index slot dibangun bila perlu
+        self._index()
+        if self._slots is None:
+            slots = {}
+            for user, f in self._frames.items():
+                for (tanggal, waktu), n in f.groupby(['tanggal', 'waktu'], sort=False).size().items():
+                    slots.setdefault((user, tanggal), {})[waktu] = int(n)
+            self._slots = slots
+        return self._slots
+
+    def _slot_add(self, user, tanggal, waktu, n):
+        # Tambal index slot saat tulis (n = +1 / -1), tanpa membangun ulang
+        if self._slots is None: return
+        day = self._slots.setdefault((user, str(tanggal)), {})
+        day[waktu] = day.get(waktu, 0) + n
+        if day[waktu] <= 0: del day[waktu]
+
+    def slot_mask(self, user, tanggal, slots):
+        # O(1): lookup dict (user, tanggal) lalu bitmap dari <= len(slots) slot
+        with self._lock: return slot_bits(self._slot_index().get((user, str(tanggal)), {}), slots)
+
+    def search_logs(self, user, start_date, end_date, query):
+        terms = search_terms(query)
+        if not terms: return self.query_logs(user, start_date, end_date)
+        with self._lock:
+            f = self._index().get(user)
+            if f is None or f.empty: return empty_logs()
+            if user not in self._text: self._text[user] = TextIndex(f['id'].tolist(), f['aktivitas'].tolist(), f['hasil'].tolist())
+            ids = self._text[user].match(terms)
+        df = self.query_logs(user, start_date, end_date)
+        return df[df['id'].isin(ids)]
+
+    def _touch(self):
+        self._all = None; self.version += 1
+
+    def _alloc_ids(self, n):
+        # Mode async: id dialokasikan dari cache (tanpa round-trip), monoton di dalam proses
+        top = max((int(f['id'].max()) for f in self._index().values() if not f.empty), default=0)
+        start = max(top + 1, self._next_id)
+        self._next_id = start + n
+        return list(range(start, start + n))
+
+    def invalidate(self):
+        with self._lock: self._frames = None; self._slots = None; self._touch()
+
+    def write_status(self, user):
+        if self.writer is None: return 0, []
+        return self.writer.pending(user), self.writer.failures(user)
+
+    def retry_failed(self, user):
+        if self.writer is not None: self.writer.retry_failed(user)
+
+    def discard_failed(self, user):
+        # Buang perubahan yang gagal dan muat ulang cache dari backend
+        if self.writer is not None: self.writer.discard_failed(user)
+        self.invalidate()
+
+    def refresh(self):
+        with self._lock:
+            self._frames = None; self._users = None; self._passwords = None
+            self._index()
+
+    def load_logs(self):
+        with self._lock:
+            frames = self._index()
+            if self._all is None:
+                self._all = pd.concat(list(frames.values()), ignore_index=True).sort_values('id', ignore_index=True) if frames else empty_logs()
+            return self._all.copy()
+
+    def user_logs(self, user):
+        with self._lock: return self._index().get(user, empty_logs())
+
+    def load_users(self):
+        with self._lock:
+            self._sync_bus()
+            if self._users is None:
+                users = self.backend.load_users()
+                if 'username' not in users.columns or 'password' not in users.columns: users = empty_users()
+                self._users = users; self._passwords = dict(zip(users['username'], users['password']))
+                self._users_loaded_at = time.time()
+            return self._users.copy()
+
+    def password_hash(self, username):
+        with self._lock:
+            self._sync_bus()
+            if self._users is None: self.load_users()
+            pw = self._passwords.get(username)
+            if pw is None and time.time() - self._users_loaded_at > USER_REFRESH_SECONDS:
+                # refresh-on-miss: user baru dari proses/perangkat lain
+                self._users = None
+                self.load_users()
+                pw = self._passwords.get(username)
+            return pw
+
+    def _patch_users(self, rows):
+        if self._users is None: return
+        self._users = pd.concat([self._users, pd.DataFrame(rows)], ignore_index=True)
+        self._passwords.update((r['username'], r['password']) for r in rows)
+
+    def _reloaded_since(self, gen):
+        # PERBAIKAN: mode sinkron menulis ke backend di luar lock. Bila cache dimuat ulang (TTL / bus) di sela
+        # itu, hasil tulis bisa sudah ada di cache atau belum -> jangan ditambal (baris ganda / rev naik dua
+        # kali -> ConflictError palsu), muat ulang di baca berikutnya
+        if gen == self._gen: return False
+        self.invalidate(); return True
+
+    def append_logs(self, user, rows):
+        if not rows: return []
+        gen = self._gen
+        if self.writer is None: ids = self.backend.append_logs(user, rows)
+        with self._lock:
+            if self.writer is not None:
+                ids = self._alloc_ids(len(rows))
+                self.writer.submit(user, [('insert', i, log_record(user, r, i)) for r, i in zip(rows, ids)])
+            else: self._reloaded_since(gen)
+            self._patch_insert(user, [log_record(user, r, i) for r, i in zip(rows, ids)])
+        if self.writer is None: self._publish("logs", [user])
+        return ids
+
+    def _patch_insert(self, user, recs):
+        # Tambal cache (frame, pemilik id, index slot & teks) dengan baris baru, tanpa refetch
+        if self._frames is None: return
+        df = pd.DataFrame(recs, columns=LOG_COLUMNS)
+        old = self._frames.get(user)
+        self._frames[user] = df if old is None or old.empty else pd.concat([old, df], ignore_index=True)
+        self._owner.update(dict.fromkeys(df['id'].tolist(), user))
+        for r in recs:
+            self._slot_add(user, r['tanggal'], r['waktu'], 1)
+            if user in self._text: self._text[user].add(int(r['id']), r['aktivitas'], r['hasil'])
+        self._touch()
+
+    def _patch_update(self, log_id, fields):
+        user = self._owner.get(int(log_id))
+        if self._frames is None or user not in self._frames: return
+        f = self._frames[user].copy()  # copy-on-write: pembaca lain tetap memegang frame lama
+        mask = f['id'] == int(log_id)
+        for old_tgl, old_wkt, old_akt, old_hsl in f.loc[mask, LOG_FIELDS].itertuples(index=False):
+            self._slot_add(user, old_tgl, old_wkt, -1)
+            if user in self._text: self._text[user].remove(int(log_id), old_akt, old_hsl)
+        self._slot_add(user, fields['tanggal'], fields['waktu'], 1)
+        if user in self._text: self._text[user].add(int(log_id), fields['aktivitas'], fields['hasil'])
+        f.loc[mask, LOG_FIELDS] = [fields[c] for c in LOG_FIELDS]
+        f.loc[mask, 'rev'] += 1
+        self._frames[user] = f
+        self._touch()
+
+    def _patch_delete(self, log_id):
+        user = self._owner.pop(int(log_id), None)
+        if self._frames is None or user not in self._frames: return user
+        f = self._frames[user]
+        for old_tgl, old_wkt, old_akt, old_hsl in f.loc[f['id'] == int(log_id), LOG_FIELDS].itertuples(index=False):
+            self._slot_add(user, old_tgl, old_wkt, -1)
+            if user in self._text: self._text[user].remove(int(log_id), old_akt, old_hsl)
+        self._frames[user] = f[f['id'] != int(log_id)].reset_index(drop=True)
+        self._touch()
+        return user
+
+    def _cached_rev(self, log_id):
+        f = self._frames.get(self._owner.get(int(log_id)))
+        return None if f is None else int(f.loc[f['id'] == int(log_id), 'rev'].iloc[0])
+
+    def _check_rev(self, log_id, rev):
+        # Mode async: konflik yang sudah terlihat di cache langsung ditolak, sisanya dicek writer ke backend
+        self._index()
+        if int(log_id) not in self._owner: return False
+        if rev is not None and self._cached_rev(log_id) != int(rev): raise ConflictError(log_id)
+        return True
+
+    def update_log(self, log_id, tanggal, waktu, aktivitas, hasil, rev=None):
+        gen = self._gen
+        if self.writer is None:
+            try: ok = self.backend.update_log(log_id, tanggal, waktu, aktivitas, hasil, rev=rev)
+            except ConflictError: self.invalidate(); raise
+        with self._lock:
+            if self.writer is not None:
+                ok = self._check_rev(log_id, rev)
+                if ok: self.writer.submit(self._owner[int(log_id)], [('update', log_id, log_fields(tanggal, waktu, aktivitas, hasil), rev)])
+            else: self._reloaded_since(gen)
+            user = self._owner.get(int(log_id))
+            if ok and self.writer is None: self._publish("logs", [user] if user else [])
+            if ok: self._patch_update(log_id, log_fields(tanggal, waktu, aktivitas, hasil))
+        return ok
+
+    def delete_log(self, log_id, rev=None):
+        gen = self._gen
+        if self.writer is None:
+            try: ok = self.backend.delete_log(log_id, rev=rev)
+            except ConflictError: self.invalidate(); raise
+        with self._lock:
+            if self.writer is not None:
+                ok = self._check_rev(log_id, rev)
+                if ok: self.writer.submit(self._owner[int(log_id)], [('delete', log_id, rev)])
+            else: self._reloaded_since(gen)
+            user = self._patch_delete(log_id) if ok else None
+            if ok and self.writer is None: self._publish("logs", [user] if user else [])
+        return ok
+
+    def restore_logs(self, df):
+        # Jarang & besar: tulisan yang masih antre diselesaikan dulu, lalu cache dimuat ulang sekali
+        if self.writer is not None: self.writer.flush(timeout=60)
+        try: return self.backend.restore_logs(df)
+        finally: self.invalidate(); self._publish("logs", df['user'].dropna().unique().tolist())
+
+    def write_batch(self, ops, tag=None):
+        # Batch mentah (operasi user lewat append/update/delete yang menambal cache): antrean diselesaikan dulu,
+        # batch diteruskan ke backend, lalu cache dimuat ulang dan semua worker dikabari
+        if self.writer is not None: self.writer.flush(timeout=60)
+        try: return self.backend.write_batch(ops, tag=tag)
+        finally: self.invalidate(); self._publish("logs")
+
+    def _on_write(self, result, users=()):
+        # Dipanggil BackgroundWriter setelah batch ditulis: kabari worker lain, terapkan id pengganti,
+        # muat ulang bila ada konflik atau cache dimuat ulang selagi batch ini dikirim (lihat _replay)
+        self._publish("logs", users)
+        with self._lock:
+            if result.conflicts or result.missing or self._resent: self._resent = False; self.invalidate(); return
+            if not result.remapped or self._frames is None: return
+            for user in {self._owner.get(i) for i in result.remapped}:
+                if user in self._frames: self._frames[user] = self._frames[user].assign(id=self._frames[user]['id'].replace(result.remapped))
+                self._text.pop(user, None)  # id berganti: index teks user itu dibangun ulang saat dicari
+            for old, new in result.remapped.items():
+                if old in self._owner: self._owner[new] = self._owner.pop(old)
+            # id lama masih dipakai baris proses lain yang sudah ada di cache (hasil muat ulang) -> muat ulang
+            if any(f['id'].isin(list(result.remapped)).any() for f in self._frames.values()): self.invalidate(); return
+            self._touch()
+
+    def add_users(self, rows):
+        self.backend.add_users(rows)
+        with self._lock: self._patch_users(rows)
+        self._publish("users")
+
+    def create_user(self, username, password):
+        users = self.load_users()
+        if not users.empty and username in users['username'].values: return False
+        if not self.backend.create_user(username, password): return False
+        with self._lock: self._patch_users([{"username": username, "password": password}])
+        self._publish("users")
+        return True
+
+
+class BackgroundWriter:
+    # Antrian tulis di thread latar. Operasi yang menumpuk selama `linger` detik digabung jadi
+    # satu write_batch; kegagalan dicoba ulang dengan backoff eksponensial, lalu dicatat per user.
+    def __init__(self, backend, retries=4, backoff=1.0, linger=0.3):
+        self.backend = backend
+        self.retries = retries
+        self.backoff = backoff
+        self.linger = linger
+        self._queue = []     # (user, ops, tag) per aksi user; tag None = batch baru, selain itu percobaan ulang
+        self._inflight = []
+        self._failed = []    # {"user", "ops", "error", "waktu", "tag"}
+        self._remap = {}     # id optimistic -> id final (bila bentrok dengan proses lain)
+        self.on_result = None
+        self._busy = False   # batch sedang diproses, termasuk on_result
+        self._cv = threading.Condition()
+        threading.Thread(target=self._run, name="lkpkt-writer", daemon=True).start()
+
+    def submit(self, user, ops):
+        with self._cv: self._queue.append((user, ops, None)); self._cv.notify_all()
+
+    def pending(self, user=None):
+        with self._cv: return sum(1 for u, *_ in self._queue + self._inflight if user is None or u == user)
+
+    def pending_ops(self):
+        # Operasi yang belum pasti ada di backend, urut: [(user, ops, sedang_dikirim)], id sudah diterjemahkan
+        with self._cv:
+            return [(u, [self._translate(op) for op in item], sent) for sent, items in ((True, self._inflight), (False, self._queue)) for u, item, _ in items]
+
+    def failures(self, user=None):
+        with self._cv: return [f for f in self._failed if user is None or f['user'] == user]
+
+    def retry_failed(self, user):
+        with self._cv:
+            again = [f for f in self._failed if f['user'] == user]
+            self._failed = [f for f in self._failed if f['user'] != user]
+            self._queue.extend((f['user'], f['ops'], f['tag']) for f in again); self._cv.notify_all()
+
+    def discard_failed(self, user):
+        with self._cv: self._failed = [f for f in self._failed if f['user'] != user]
+
+    def flush(self, timeout=None):
+        # Tunggu sampai antrian kosong & cache sudah ditambal hasilnya (dipakai saat shutdown / benchmark / tes)
+        with self._cv: return self._cv.wait_for(lambda: not self._queue and not self._inflight and not self._busy, timeout)
+
+    def _run(self):
+        # PERBAIKAN: error tak terduga dicatat ke log dan tidak mematikan thread; batch yang sedang diproses
+        # dipindah ke daftar gagal (bisa dicoba ulang) supaya tidak tertahan sebagai "menunggu" selamanya
+        while True:
+            try: self._run_batch()
+            except Exception as e:
+                log.exception("penulis latar: batch gagal diproses")
+                with self._cv:
+                    self._failed.extend({"user": u, "ops": item, "error": str(e), "waktu": time.strftime('%H:%M:%S'), "tag": tag} for u, item, tag in self._inflight)
+                    self._inflight = []
+            with self._cv: self._busy = False; self._cv.notify_all()
+
+    def _run_batch(self):
+        with self._cv:
+            self._cv.wait_for(lambda: self._queue)
+        time.sleep(self.linger)  # beri kesempatan klik berikutnya ikut masuk batch yang sama
+        with self._cv:
+            # Satu batch = awalan antrian dengan tag yang sama (urutan aksi tetap terjaga). Tag dipakai ulang
+            # di setiap percobaan -> backend melewati operasi yang ternyata sudah masuk
+            n = next((k for k, q in enumerate(self._queue) if q[2] != self._queue[0][2]), len(self._queue))
+            tag = self._queue[0][2] or secrets.token_hex(4)
+            self._inflight, self._queue = [(u, item, tag) for u, item, _ in self._queue[:n]], self._queue[n:]
+            self._busy = True
+        ops = [self._translate(op) for _, item, _ in self._inflight for op in item]
+        users = {u for u, *_ in self._inflight}
+        error = result = None
+        for attempt in range(self.retries + 1):
+            try: result = self.backend.write_batch(ops, tag=tag); error = None; break
+            except Exception as e:
+                error = e
+                if attempt < self.retries: time.sleep(self.backoff * 2 ** attempt)
+        with self._cv:
+            if error is not None:
+                self._failed.extend({"user": u, "ops": item, "error": str(error), "waktu": time.strftime('%H:%M:%S'), "tag": tag} for u, item, _ in self._inflight)
+            elif result.conflicts:
+                self._failed.extend({"user": u, "ops": item, "error": "Konflik: data sudah diubah di sesi lain", "waktu": time.strftime('%H:%M:%S'), "tag": None}
+                                    for u, item, _ in self._inflight if any(int(op[1]) in result.conflicts for op in item))
+            if result is not None: self._remap.update(result.remapped)
+            self._inflight = []
+            self._cv.notify_all()
+        if result is not None and self.on_result is not None:
+            # Batch sudah tertulis; error di callback (tambal cache / publish) cukup dicatat
+            try: self.on_result(result, users)
+            except Exception: log.exception("penulis latar: on_result gagal")
+
+    def _translate(self, op):
+        # Operasi lanjutan atas baris yang id-nya sudah diganti ikut memakai id final
+        new = self._remap.get(int(op[1]))
+        if new is None: return op
+        return (op[0], new, dict(op[2], id=new)) if op[0] == 'insert' else (op[0], new) + tuple(op[2:])
+
+
+class SharedBus:
+    # Kanal invalidasi antar proses: beberapa worker Streamlit (di belakang load balancer) memakai satu file
+    # SQLite bersama. Setiap tulis dicatat sebagai event (jenis + user yang berubah); worker lain membacanya
+    # paling sering sekali per `poll` detik lalu menyegarkan cache miliknya. Juga menyimpan token sesi yang dicabut.
+    def __init__(self, path, poll=1.0, keep=3600):
+        self.origin = secrets.token_hex(8)  # id proses ini; event sendiri diabaikan (cache sudah ditambal)
+        self.poll = poll
+        self.keep = keep
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=10)
+        with self._lock:
+            self._db.execute("PRAGMA journal_mode=WAL")  # pembaca (poll) tidak memblok penulis
+            self._db.executescript("""
+                CREATE TABLE IF NOT EXISTS events (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    origin TEXT,
+                    kind TEXT,
+                    users TEXT,
+                    at REAL
+                );
+                CREATE TABLE IF NOT EXISTS revoked (
+                    sig TEXT PRIMARY KEY,
+                    until REAL
+                );
+            """)
+            self._seen = self._db.execute("SELECT COALESCE(MAX(seq), 0) FROM events").fetchone()[0]
+        self._checked = time.time()
+
+    def publish(self, kind, users=()):
+        # kind = "logs" | "users"; users = user yang lognya berubah (kosong = semua)
+        with self._lock:
+            seq = self._db.execute("INSERT INTO events (origin, kind, users, at) VALUES (?, ?, ?, ?)", (self.origin, kind, json.dumps(sorted(users)), time.time())).lastrowid
+            if seq % 500 == 0: self._db.execute("DELETE FROM events WHERE at < ?", (time.time() - self.keep,))
+
+    def poll_events(self):
+        # -> [(kind, users)] dari proses lain sejak poll terakhir. Event yang sudah terhapus (proses lama diam
+        # lebih dari `keep` detik) -> ("all", []) supaya seluruh cache dimuat ulang.
+        now = time.time()
+        if now - self._checked < self.poll: return []
+        with self._lock:
+            self._checked = now
+            first = self._db.execute("SELECT MIN(seq) FROM events").fetchone()[0]
+            rows = self._db.execute("SELECT seq, origin, kind, users FROM events WHERE seq > ? ORDER BY seq", (self._seen,)).fetchall()
+            gap = first is not None and first > self._seen + 1
+            if rows: self._seen = rows[-1][0]
+        events = [(kind, json.loads(users)) for _, origin, kind, users in rows if origin != self.origin]
+        return [("all", [])] if gap else events
+
+    def revoke(self, sig, until):
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO revoked (sig, until) VALUES (?, ?)", (sig, until))
+            self._db.execute("DELETE FROM revoked WHERE until < ?", (time.time(),))
+
+    def is_revoked(self, sig):
+        with self._lock: return self._db.execute("SELECT 1 FROM revoked WHERE sig=?", (sig,)).fetchone() is not None
+
+
+def make_storage(cfg, conn_factory):
+    # cfg = st.secrets["storage"], contoh: backend = "sqlite", sqlite_path = "kegiatan.db", cache_ttl = 600
+    backend = str(cfg.get("backend", "gsheets")).lower()
+    if backend == "sqlite": store = SQLiteStorage(cfg.get("sqlite_path", "kegiatan.db"))
+    elif backend == "gsheets": store = GSheetsStorage(conn_factory, changelog=cfg.get("sync") == "delta")
+    else: raise ValueError(f"Backend storage tidak dikenal: {backend}")
+    # sync = "delta": sheet disalin ke snapshot SQLite lokal, yang diunduh hanya baris yang berubah
+    if backend == "gsheets" and cfg.get("sync") == "delta":
+        store = DeltaSyncStorage(store, SQLiteStorage(cfg.get("snapshot_path", "kegiatan_snapshot.db")),
+                                 interval=cfg.get("sync_interval", 30), reconcile=cfg.get("reconcile_interval", 3600))
+        cfg = {"cache_ttl": cfg.get("sync_interval", 30), **cfg}
+    # Beberapa worker: shared_path = "lkpkt_shared.db" (file SQLite bersama) -> cache tiap proses disegarkan
+    # lewat event tulis dari worker lain, dicek paling sering tiap shared_poll detik
+    bus = SharedBus(cfg["shared_path"], poll=cfg.get("shared_poll", 1.0)) if cfg.get("shared_path") else None
+    # Sheets selalu lewat cache proses; SQLite sudah cepat sehingga cache opsional.
+    # async_writes = true: penulisan lewat BackgroundWriter (butuh cache untuk hasil optimistic)
+    if cfg.get("async_writes", False):
+        return CachedStorage(store, ttl=cfg.get("cache_ttl", 600), writer=BackgroundWriter(store, retries=cfg.get("write_retries", 4)), bus=bus)
+    if cfg.get("cache", backend == "gsheets"): store = CachedStorage(store, ttl=cfg.get("cache_ttl", 600), bus=bus)
+    else: store.bus = bus  # tanpa cache: bus hanya dipakai untuk token sesi yang dicabut
+    return store
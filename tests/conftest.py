@@ -0,0 +1,27 @@
+import os
+import sys
+import pytest
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench import FakeGSheetsConnection  # noqa: E402
+from storage import LOG_COLUMNS  # noqa: E402
+
+SLOTS = ["08.00 - 10.00", "10.00 - 12.00", "13.00 - 15.00", "15.00 - 17.00"]
+
+def row(tanggal="2030-01-01", waktu=SLOTS[0], aktivitas="rapat", hasil="selesai"):
+    return {"tanggal": tanggal, "waktu": waktu, "aktivitas": aktivitas, "hasil": hasil}
+
+@pytest.fixture
+def sheet():
+    # Sheet palsu berisi 3 log milik "a" (id 1-3) dan 1 user
+    conn = FakeGSheetsConnection()
+    conn.load("logs", pd.DataFrame([{"user": "a", **row(waktu=SLOTS[i]), "id": i + 1, "rev": 0} for i in range(3)], columns=LOG_COLUMNS))
+    conn.load("users", pd.DataFrame({"username": ["a"], "password": ["x"]}))
+    return conn
+
+def sheet_logs(conn):
+    # Isi sheet apa adanya (termasuk tombstone), id sebagai int
+    df = conn.read("logs")
+    return df.assign(id=pd.to_numeric(df['id']).astype(int))
@@ -0,0 +1,108 @@
+import hashlib
+import os
+from datetime import date, timedelta
+import pytest
+import streamlit as st
+from streamlit.testing.v1 import AppTest
+from conftest import SLOTS
+from sesi import make_token, read_token
+from storage import SQLiteStorage
+
+APP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+SECRET = "rahasia-bersama"
+
+
+@pytest.fixture(autouse=True)
+def fresh_worker():
+    # get_storage & daftar token dicabut di-cache per proses: dikosongkan supaya tiap tes = worker baru
+    st.cache_resource.clear(); yield; st.cache_resource.clear()
+
+
+@pytest.fixture
+def db(tmp_path):
+    path = str(tmp_path / "k.db")
+    SQLiteStorage(path).add_users([{"username": "budi", "password": hashlib.sha256(b"rahasia").hexdigest()}])
+    return path
+
+
+def app(db, token=None, bus=None):
+    at = AppTest.from_file(APP, default_timeout=60)
+    at.secrets["storage"] = {"backend": "sqlite", "sqlite_path": db, "cache": True, **({"shared_path": bus} if bus else {})}
+    at.secrets["session"] = {"secret": SECRET, "ttl_minutes": 30}
+    if token: at.query_params["s"] = token
+    return at.run()
+
+
+def logout(at):
+    next(b for b in at.sidebar.button if b.label == "Log Out").click().run()
+
+
+def test_login_form_issues_token(db):
+    at = app(db)
+    at.text_input(key="l_u").input("budi"); at.text_input(key="l_p").input("rahasia")
+    next(b for b in at.button if b.label == "Masuk").click().run()
+    assert at.session_state["logged_in"] and not at.exception
+    assert app(db, at.query_params["s"]).session_state["username"] == "budi"
+
+
+def test_token_resumes_session_and_bad_tokens_are_dropped(db):
+    assert app(db, make_token("budi", SECRET, 3600)).session_state["logged_in"]
+    for tok in (make_token("budi", SECRET, -5), make_token("budi", "secret-lain", 3600), make_token("tidak_ada", SECRET, 3600)):
+        at = app(db, tok)
+        assert not at.session_state["logged_in"] and "s" not in at.query_params
+
+
+def test_resume_rotates_token(db):
+    # URL yang bocor hanya berlaku sampai pemiliknya memulihkan sesi: token lama dicabut, URL berisi token baru
+    tok = make_token("budi", SECRET, 1800)
+    at = app(db, tok)
+    assert at.session_state["logged_in"] and at.query_params["s"] != tok
+    assert not app(db, tok).session_state["logged_in"]
+    assert app(db, at.query_params["s"]).session_state["logged_in"]
+
+
+def test_active_session_refreshes_token_past_half_life(db):
+    at = app(db, make_token("budi", SECRET, 1800))
+    fresh = at.query_params["s"]
+    at.run(); assert at.query_params["s"] == fresh  # umur masih penuh: tidak dirotasi
+    old = at.query_params["s"] = make_token("budi", SECRET, 600)
+    at.run()
+    assert at.session_state["logged_in"] and at.query_params["s"] != old
+    assert read_token(at.query_params["s"], SECRET)[2] > read_token(old, SECRET)[2]
+
+
+def test_logout_revokes_token_without_bus(db):
+    at = app(db, make_token("budi", SECRET, 1800))
+    tok = at.query_params["s"]; logout(at)
+    assert not at.session_state["logged_in"]
+    assert not app(db, tok).session_state["logged_in"]  # token lama dipakai ulang -> ditolak
+
+
+def test_logout_revokes_token_on_other_worker(db, tmp_path):
+    bus = str(tmp_path / "bus.db")
+    at = app(db, make_token("budi", SECRET, 1800), bus)
+    tok = at.query_params["s"]; logout(at)
+    st.cache_resource.clear()  # worker lain: storage & daftar lokal baru, hanya bus yang sama
+    assert not app(db, tok, bus).session_state["logged_in"]
+
+
+def test_rekap_closed_month_cache_follows_edits(db):
+    # Bulan yang sudah tutup di-cache per sidik (jumlah, total id, total rev): tambah baris & edit lama tetap terlihat
+    st.cache_data.clear()
+    lalu = date.today().replace(day=1) - timedelta(days=1)
+    s = SQLiteStorage(db)
+    s.add_users([{"username": "siti", "password": "x"}])
+    [log_id] = s.append_logs("siti", [{"tanggal": str(lalu), "waktu": SLOTS[0], "aktivitas": "rapat", "hasil": ""}])
+    at = AppTest.from_file(APP, default_timeout=60)
+    at.secrets["storage"] = {"backend": "sqlite", "sqlite_path": db}
+    at.secrets["session"] = {"secret": SECRET}
+    at.secrets["laporan"] = {"supervisors": ["budi"]}
+    at.query_params["s"] = make_token("budi", SECRET, 1800)
+    at.run(); next(r for r in at.sidebar.radio if r.label == "Navigasi").set_value("Rekap Supervisor").run()
+    at.date_input(key="rekap_dari_key").set_value(lalu.replace(day=1)).run()
+    ringkas = lambda: at.dataframe[0].value.set_index('user').loc["siti", ['aktivitas', 'slot_terisi']].tolist()
+    assert ringkas() == [1, 1]
+    s.append_logs("siti", [{"tanggal": str(lalu), "waktu": SLOTS[0], "aktivitas": "rapat lanjutan", "hasil": ""}])
+    at.run(); assert ringkas() == [2, 1]
+    s.update_log(log_id, str(lalu), SLOTS[1], "rapat", "", rev=0)  # jumlah & id sama, hanya rev berubah
+    at.run(); assert ringkas() == [2, 2]
@@ -0,0 +1,17 @@
+import json
+import bench
+
+
+def fake_run(p50):
+    return lambda args: {"sqlite/1000/add_data": {"p50": p50, "p95": p50, "calls": 0}}
+
+
+def test_compare_fails_on_regression_and_never_saves(tmp_path, monkeypatch):
+    path = tmp_path / "baseline.json"
+    path.write_text(json.dumps({"meta": {}, "results": {"sqlite/1000/add_data": {"p50": 10.0, "p95": 10.0, "calls": 0}}}))
+    monkeypatch.setattr(bench, "BASELINE", str(path))
+    monkeypatch.setattr(bench, "run", fake_run(11.0))
+    assert bench.main(["--compare"]) == 0  # masih dalam toleransi
+    monkeypatch.setattr(bench, "run", fake_run(50.0))
+    assert bench.main(["--compare", "--save"]) == 1
+    assert json.loads(path.read_text())["results"]["sqlite/1000/add_data"]["p50"] == 10.0  # baseline tidak ditimpa
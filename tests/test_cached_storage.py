@@ -0,0 +1,130 @@
+from datetime import date
+from conftest import SLOTS, row, sheet_logs
+from storage import BackgroundWriter, CachedStorage, DeltaSyncStorage, GSheetsStorage, SQLiteStorage, SharedBus, TextIndex, log_fields, normalize_logs
+
+
+def test_slot_mask_sees_changes_after_invalidate(tmp_path):
+    db = SQLiteStorage(str(tmp_path / "k.db"))
+    s = CachedStorage(db)
+    s.append_logs("a", [row(waktu=SLOTS[0])])
+    assert s.slot_mask("a", "2030-01-01", SLOTS) == 0b0001
+    db.append_logs("a", [row(waktu=SLOTS[2])])  # tulis langsung ke backend, di luar cache
+    s.invalidate()
+    assert s.slot_mask("a", "2030-01-01", SLOTS) == 0b0101
+
+
+def test_slot_mask_reloads_after_ttl(tmp_path, monkeypatch):
+    db = SQLiteStorage(str(tmp_path / "k.db"))
+    s = CachedStorage(db, ttl=60)
+    assert s.slot_mask("a", "2030-01-01", SLOTS) == 0
+    db.append_logs("a", [row(waktu=SLOTS[1])])
+    monkeypatch.setattr(s, "_loaded_at", s._loaded_at - 61)
+    assert s.slot_mask("a", "2030-01-01", SLOTS) == 0b0010
+
+
+def test_slot_mask_follows_other_worker(tmp_path):
+    # Dua worker, satu database & satu bus: slot yang diisi worker b langsung terlihat di worker a
+    path, bus_path = str(tmp_path / "k.db"), str(tmp_path / "bus.db")
+    a = CachedStorage(SQLiteStorage(path), bus=SharedBus(bus_path, poll=0))
+    b = CachedStorage(SQLiteStorage(path), bus=SharedBus(bus_path, poll=0))
+    assert a.slot_mask("a", "2030-01-01", SLOTS) == 0
+    b.append_logs("a", [row(waktu=SLOTS[3])])
+    assert a.slot_mask("a", "2030-01-01", SLOTS) == 0b1000
+
+
+def test_bus_refresh_syncs_delta_snapshot(tmp_path, sheet):
+    # Worker dengan sync delta: event bus memaksa sync, bukan membaca snapshot yang baru basi `interval` detik lagi
+    bus = str(tmp_path / "bus.db")
+    delta = lambda name: DeltaSyncStorage(GSheetsStorage(lambda: sheet, changelog=True), SQLiteStorage(str(tmp_path / name)), interval=600)
+    a = CachedStorage(delta("a.db"), ttl=600, bus=SharedBus(bus, poll=0))
+    b = CachedStorage(delta("b.db"), ttl=600, bus=SharedBus(bus, poll=0))
+    assert a.slot_mask("a", "2030-01-02", SLOTS) == 0
+    b.append_logs("a", [row(tanggal="2030-01-02", waktu=SLOTS[1])])
+    b.update_log(1, "2030-01-01", SLOTS[0], "diubah b", "ok", rev=0)
+    assert a.slot_mask("a", "2030-01-02", SLOTS) == 0b0010
+    assert a.user_logs("a").set_index('id').loc[1, 'aktivitas'] == "diubah b"
+
+
+class ReloadDuringWrite(SQLiteStorage):
+    # Tulis sampai di backend, lalu (sebelum cache ditambal) sesi lain memicu reload cache karena TTL habis
+    cache = None
+    def _reload(self):
+        self.cache._loaded_at = 0; self.cache.user_logs("a")
+    def append_logs(self, user, rows):
+        ids = super().append_logs(user, rows); self._reload(); return ids
+    def write_batch(self, ops, tag=None):
+        res = super().write_batch(ops, tag); self._reload(); return res
+
+
+def test_sync_write_racing_reload_is_not_patched_twice(tmp_path):
+    db = ReloadDuringWrite(str(tmp_path / "k.db"))
+    s = db.cache = CachedStorage(db, ttl=600)
+    [log_id] = s.append_logs("a", [row()])
+    assert s.user_logs("a")['id'].tolist() == [log_id]  # tidak ganda
+    assert s.update_log(log_id, "2030-01-01", SLOTS[1], "ubah", "ok", rev=0)
+    assert s.user_logs("a")['rev'].tolist() == [1]
+    assert s.update_log(log_id, "2030-01-01", SLOTS[2], "ubah lagi", "ok", rev=1)  # tanpa ConflictError palsu
+    assert s.slot_mask("a", "2030-01-01", SLOTS) == 0b0100
+    assert s.delete_log(log_id, rev=2) and s.user_logs("a").empty
+
+
+def test_async_rows_survive_reload_from_other_worker(tmp_path, sheet):
+    # Worker a (async) menyimpan, lalu sebelum batch-nya terkirim worker b menulis -> a memuat ulang dari sheet.
+    # Baris a yang masih antre harus tetap terlihat (slot tidak boleh tampak kosong -> dobel booking)
+    bus = str(tmp_path / "bus.db")
+    a = CachedStorage(GSheetsStorage(lambda: sheet), ttl=600, writer=BackgroundWriter(GSheetsStorage(lambda: sheet), linger=0.5), bus=SharedBus(bus, poll=0))
+    b = CachedStorage(GSheetsStorage(lambda: sheet), ttl=600, bus=SharedBus(bus, poll=0))
+    a.load_logs()
+    [mine] = a.append_logs("a", [row(tanggal="2030-02-01", waktu=SLOTS[1], aktivitas="milik a")])
+    b.append_logs("b", [row(tanggal="2030-02-01")])
+    assert a.slot_mask("a", "2030-02-01", SLOTS) == 0b0010
+    assert "milik a" in a.user_logs("a")['aktivitas'].tolist() and not a.user_logs("b").empty
+    assert a.writer.flush(10)
+    assert a.user_logs("a")['aktivitas'].tolist().count("milik a") == 1
+    assert a.slot_mask("a", "2030-02-01", SLOTS) == 0b0010
+    assert sorted(a.load_logs()['id']) == sorted(normalize_logs(sheet_logs(sheet))['id'])  # id bentrok sudah diganti
+    assert a.update_log(b.user_logs("b")['id'].iloc[0], "2030-02-01", SLOTS[0], "ubah b", "", rev=0)
+
+
+def test_async_reload_while_batch_in_flight(tmp_path):
+    # Cache dimuat ulang tepat saat batch sedang ditulis: setelah batch selesai cache kembali sama dengan backend
+    db = ReloadDuringWrite(str(tmp_path / "k.db"))
+    s = db.cache = CachedStorage(db, ttl=600, writer=BackgroundWriter(db, linger=0))
+    [log_id] = s.append_logs("a", [row()])
+    assert s.writer.flush(10) and s.user_logs("a")['id'].tolist() == [log_id]
+    s.update_log(log_id, "2030-01-01", SLOTS[1], "ubah", "ok", rev=0)
+    assert s.writer.flush(10)
+    assert s.user_logs("a")[['aktivitas', 'rev']].values.tolist() == [["ubah", 1]]
+    assert s.slot_mask("a", "2030-01-01", SLOTS) == 0b0010
+
+
+def test_text_index_prefix_match_and_incremental_updates():
+    idx = TextIndex([1, 2], ["Rapat koordinasi", "rapat"], ["Évaluasi", None])
+    assert idx.match(["rap"]) == {1, 2} and idx.match(["rapat", "eval"]) == {1} and idx.match(["zz"]) == set()
+    idx.remove(1, "Rapat koordinasi", "Évaluasi"); idx.add(3, "evaluasi akhir")
+    assert idx.match(["eval"]) == {3} and idx.match(["koor"]) == set()
+
+
+def test_cached_search_follows_writes_like_fts(tmp_path):
+    db = SQLiteStorage(str(tmp_path / "k.db"))
+    s = CachedStorage(db)
+    ids = s.append_logs("a", [row(aktivitas="rapat koordinasi"), row(aktivitas="lain")])
+    hari = date(2030, 1, 1)
+    cari = lambda st, q: sorted(st.search_logs("a", hari, hari, q)['id'])
+    assert cari(s, "rap") == [ids[0]]  # index teks user a dibangun di sini, lalu ditambal per tulis
+    [baru] = s.append_logs("a", [row(aktivitas="rapat evaluasi")])
+    s.update_log(ids[1], "2030-01-01", SLOTS[1], "evaluasi anggaran", "", rev=0)
+    s.delete_log(ids[0], rev=0)
+    for q in ("rap", "eval", "evaluasi ang", "koordinasi", "lain"):
+        assert cari(s, q) == cari(db, q)
+    assert cari(s, "eval") == sorted([ids[1], baru])
+
+
+def test_raw_write_batch_goes_to_backend_and_reloads_cache(tmp_path):
+    db = SQLiteStorage(str(tmp_path / "k.db"))
+    s = CachedStorage(db, ttl=600)
+    [log_id] = s.append_logs("a", [row(waktu=SLOTS[0])])
+    assert s.slot_mask("a", "2030-01-01", SLOTS) == 0b0001
+    res = s.write_batch([('update', log_id, log_fields("2030-01-01", SLOTS[1], "ubah", ""), 0)])
+    assert not res.conflicts and db.user_logs("a")['rev'].tolist() == [1]
+    assert s.slot_mask("a", "2030-01-01", SLOTS) == 0b0010 and s.user_logs("a")['rev'].tolist() == [1]
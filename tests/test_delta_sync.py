@@ -0,0 +1,79 @@
+import pandas as pd
+import pytest
+from conftest import SLOTS, FakeGSheetsConnection, row, sheet_logs
+from storage import LOG_COLUMNS, DeltaSyncStorage, GSheetsStorage, SQLiteStorage, normalize_logs
+
+
+def delta(conn, path, **kw):
+    return DeltaSyncStorage(GSheetsStorage(lambda: conn, changelog=True), SQLiteStorage(str(path)), interval=0, **kw)
+
+
+def same_as_sheet(d, conn):
+    got = d.load_logs().sort_values('id').reset_index(drop=True)
+    want = normalize_logs(sheet_logs(conn)).sort_values('id').reset_index(drop=True)
+    return got[LOG_COLUMNS].astype(str).equals(want[LOG_COLUMNS].astype(str))
+
+
+def cells_read(conn, fn):
+    seen, orig = [], conn._call
+    conn._call = lambda cells=None: (seen.append(sum(len(r) for r in cells or [])), orig(cells))
+    try: fn()
+    finally: del conn._call
+    return len(seen), sum(seen)
+
+
+def test_delta_follows_other_writer(tmp_path, sheet):
+    d, other = delta(sheet, tmp_path / "s.db"), GSheetsStorage(lambda: sheet, changelog=True)
+    assert same_as_sheet(d, sheet)
+    other.append_logs("a", [row(aktivitas="baru")])
+    other.update_log(1, "2030-01-01", SLOTS[0], "diubah", "ok", rev=0)
+    other.delete_log(2, rev=0)
+    assert d.sync(force=True) == 3 and same_as_sheet(d, sheet)
+    other.restore_logs(normalize_logs(pd.DataFrame([{"user": "a", **row(aktivitas="kembali"), "id": 2, "rev": 0}])))
+    assert d.sync(force=True) == 1 and same_as_sheet(d, sheet)
+    assert d.sync(force=True) == 0  # tidak ada yang berubah
+
+
+def test_delta_sees_remapped_ids(tmp_path, sheet):
+    d = delta(sheet, tmp_path / "s.db")
+    a, b = GSheetsStorage(lambda: sheet, changelog=True), GSheetsStorage(lambda: sheet, changelog=True)
+    a._scan_ids(); b._scan_ids()
+    ws, orig = sheet.sheets["logs"], sheet.sheets["logs"].append_rows
+    def racing(*args, **kwargs):
+        # b sudah append id 4; pembaca sync tepat sebelum a mengganti id gandanya
+        ws.append_rows = orig; res = orig(*args, **kwargs); d.sync(force=True); return res
+    b.append_logs("a", [row(aktivitas="dari b")])
+    ws.append_rows = racing
+    assert a.append_logs("a", [row(aktivitas="dari a"), row(aktivitas="dari a 2")]) == [6, 5]  # baris terakhir tetap id 5
+    d.sync(force=True)
+    assert same_as_sheet(d, sheet)
+
+
+def test_delta_reads_only_new_and_changed_rows(tmp_path):
+    conn = FakeGSheetsConnection()
+    conn.load("logs", pd.DataFrame([{"user": "a", **row(), "id": i + 1, "rev": 0} for i in range(5000)], columns=LOG_COLUMNS))
+    d, other = delta(conn, tmp_path / "s.db"), GSheetsStorage(lambda: conn, changelog=True)
+    d.sync(force=True)
+    other.append_logs("a", [row(aktivitas="baru")])
+    other.update_log(10, "2030-01-01", SLOTS[1], "diubah", "ok", rev=0)
+    calls, cells = cells_read(conn, lambda: d.sync(force=True))
+    assert calls == 2 and cells <= 40  # catatan perubahan + (baris terakhir, baris baru, baris 11)
+    assert same_as_sheet(d, conn)
+
+
+def test_delta_reconciles_when_rows_shift(tmp_path, sheet):
+    d = delta(sheet, tmp_path / "s.db")
+    d.sync(force=True)
+    del sheet.sheets["logs"].rows[1]  # baris id 1 dihapus manual dari sheet
+    GSheetsStorage(lambda: sheet, changelog=True).append_logs("a", [row(aktivitas="baru")])
+    d.sync(force=True)
+    assert same_as_sheet(d, sheet) and 1 not in d.load_logs()['id'].tolist()
+
+
+def test_delta_marks_survive_restart(tmp_path, sheet):
+    delta(sheet, tmp_path / "s.db").sync(force=True)
+    GSheetsStorage(lambda: sheet, changelog=True).update_log(3, "2030-01-01", SLOTS[2], "diubah", "ok", rev=0)
+    d = delta(sheet, tmp_path / "s.db")  # proses baru, snapshot di disk yang sama
+    calls, cells = cells_read(sheet, lambda: d.sync(force=True))
+    assert calls == 3 and cells <= 30  # + header sekali per proses, tanpa rekonsiliasi penuh
+    assert same_as_sheet(d, sheet)
@@ -0,0 +1,100 @@
+import io
+from datetime import date
+import openpyxl
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+from conftest import SLOTS
+import laporan
+from laporan import export_snapshot, generate_excel, generate_rekap_excel, iter_excel_rows, load_snapshot, prepare_restore, rekap_harian, rekap_periode, rekap_ringkasan
+from storage import LOG_COLUMNS, SQLiteStorage, log_record, normalize_logs
+
+
+def four_rows():
+    rows = [("2030-01-01", SLOTS[0]), ("2030-01-01", SLOTS[1]), ("2030-01-01", SLOTS[2]), ("2030-01-02", SLOTS[0])]
+    return normalize_logs(pd.DataFrame([log_record("a", {"tanggal": t, "waktu": w, "aktivitas": f"x{i}", "hasil": ""}, i + 1) for i, (t, w) in enumerate(rows)]))
+
+
+def test_excel_merges_date_per_day():
+    df = four_rows()
+    ws = openpyxl.load_workbook(io.BytesIO(generate_excel(iter_excel_rows(df)))).active
+    assert [str(r) for r in ws.merged_cells.ranges] == ["B2:B4"]  # hari dengan 1 slot tidak di-merge
+    assert [ws.cell(r, 3).value for r in range(2, 6)] == [SLOTS[0], SLOTS[1], SLOTS[2], SLOTS[0]]
+    assert ws["B2"].value != ws["B5"].value and ws["B5"].value
+
+
+def test_large_excel_streams_without_merges(monkeypatch):
+    # Di atas MERGE_MAX_ROWS: constant_memory, tanggal di baris pertama tiap hari, tidak ada sel yang hilang
+    monkeypatch.setattr(laporan, "MERGE_MAX_ROWS", 3)
+    df = four_rows()
+    books = [generate_excel(iter_excel_rows(df)), generate_rekap_excel(pd.DataFrame(columns=[k for k, _, _ in laporan.REKAP_HEADERS]), {}, {"a": df})]
+    for ws in [openpyxl.load_workbook(io.BytesIO(books[0])).active, openpyxl.load_workbook(io.BytesIO(books[1]))["a"]]:
+        assert not ws.merged_cells.ranges
+        assert [ws.cell(r, 4).value for r in range(2, 6)] == ["x0", "x1", "x2", "x3"]
+        assert ws["B2"].value and ws["B3"].value is None and ws["B4"].value is None and ws["B5"].value
+
+
+def mixed_logs():
+    recs = [{"user": "a", "tanggal": "2030-01-02", "waktu": SLOTS[1], "aktivitas": "=1+1", "hasil": None, "id": 7, "rev": 3},
+            {"user": "b", "tanggal": "2030-01-01", "waktu": SLOTS[0], "aktivitas": "rapat, koordinasi", "hasil": "ok\nbaris 2", "id": 2, "rev": 0},
+            {"user": "a", "tanggal": "2030-01-02", "waktu": SLOTS[0], "aktivitas": "Évaluasi", "hasil": "", "id": 40, "rev": 1}]
+    return normalize_logs(pd.DataFrame(recs))
+
+
+def test_snapshot_roundtrip_keeps_ids_and_revs():
+    df = mixed_logs()
+    data = export_snapshot(df, 'semua')
+    assert pq.read_schema(io.BytesIO(data)).metadata[b'lkpkt.scope'] == b'semua'
+    rows, rejected = load_snapshot(io.BytesIO(data))
+    assert rejected.empty
+    want = df.assign(hasil=df['hasil'].fillna('')).sort_values('id').reset_index(drop=True)
+    assert rows[LOG_COLUMNS].astype(str).equals(want[LOG_COLUMNS].astype(str))
+
+
+def test_snapshot_rejects_bad_rows_and_missing_columns():
+    table = pa.table({'id': [1, 1, 2, 3], 'user': ['a', 'a', 'a', ''], 'tanggal': pa.array([None, 10957, 10957, 10957], pa.date32()),
+                      'waktu': [SLOTS[0]] * 4, 'aktivitas': ['x', 'y', ' ', 'z'], 'hasil': [''] * 4, 'rev': [0] * 4})
+    buf = io.BytesIO(); pq.write_table(table, buf)
+    rows, rejected = load_snapshot(io.BytesIO(buf.getvalue()))
+    assert rows.empty and rejected['Alasan'].tolist() == ['Tanggal kosong', 'ID ganda', 'Uraian kosong', 'User kosong']
+    buf = io.BytesIO(); pq.write_table(table.drop(['rev']), buf)
+    with pytest.raises(ValueError): load_snapshot(io.BytesIO(buf.getvalue()))
+
+
+@pytest.mark.parametrize("merge_max", [5000, 1])
+def test_excel_export_roundtrips_through_prepare_restore(monkeypatch, merge_max):
+    # Tanggal di-merge (mode biasa) maupun hanya di baris pertama (constant_memory) terbaca lagi per baris
+    monkeypatch.setattr(laporan, "MERGE_MAX_ROWS", merge_max)
+    df = mixed_logs()
+    rows, rejected = prepare_restore(pd.read_excel(io.BytesIO(generate_excel(iter_excel_rows(df))), engine='openpyxl'))
+    assert rejected.empty
+    key = ['tanggal', 'waktu', 'aktivitas', 'hasil']
+    assert rows[key].values.tolist() == df.assign(hasil=df['hasil'].fillna('')).sort_values(['tanggal', 'waktu'])[key].values.tolist()
+
+
+def test_snapshot_restore_into_empty_database(tmp_path):
+    src = SQLiteStorage(str(tmp_path / "a.db")); src.restore_logs(mixed_logs())
+    rows, _ = load_snapshot(io.BytesIO(export_snapshot(normalize_logs(src.load_logs()), 'semua')))
+    dst = SQLiteStorage(str(tmp_path / "b.db"))
+    assert dst.restore_logs(rows) == 3 and dst.restore_logs(rows) == 0
+    got = lambda s: normalize_logs(s.load_logs()).fillna('').sort_values('id')[LOG_COLUMNS].values.tolist()
+    assert got(dst) == got(src)
+
+
+def test_rekap_counts_distinct_slots_and_fills_user_period_grid():
+    # 2030-01-05 Sabtu (libur yang diisi menambah kapasitas), slot di luar SLOTS & slot ganda tidak dihitung dua kali
+    rows = [("2030-01-05", SLOTS[0]), ("2030-01-07", SLOTS[0]), ("2030-01-07", SLOTS[0]), ("2030-01-07", "lain"), ("2030-01-08", SLOTS[1])]
+    df = normalize_logs(pd.DataFrame([log_record("a", {"tanggal": t, "waktu": w, "aktivitas": "x", "hasil": ""}, i + 1) for i, (t, w) in enumerate(rows)]))
+    harian = rekap_harian(df, SLOTS)
+    assert harian[['tanggal', 'aktivitas', 'slot_terisi', 'libur']].values.tolist() == [
+        ["2030-01-05", 1, 1, True], ["2030-01-07", 3, 1, False], ["2030-01-08", 1, 1, False]]
+
+    per = rekap_periode(harian, 'Mingguan', date(2030, 1, 1), date(2030, 1, 10), ["a", "b"], len(SLOTS))
+    assert per[['user', 'label', 'aktivitas', 'slot_terisi', 'hari_kerja']].values.tolist() == [
+        ["a", "31/12 - 06/01/2030", 1, 1, 4], ["a", "07/01 - 13/01/2030", 4, 2, 4],
+        ["b", "31/12 - 06/01/2030", 0, 0, 4], ["b", "07/01 - 13/01/2030", 0, 0, 4]]  # hari kerja dipotong ke rentang
+    assert per['fill_rate'].tolist() == [1 / 20, 2 / 16, 0.0, 0.0]
+    ringkas = rekap_ringkasan(per, len(SLOTS)).set_index('user')
+    assert ringkas.loc["a", 'hari_kerja'] == 8 and ringkas.loc["a", 'fill_rate'] == 3 / 36 and ringkas.loc["b", 'fill_rate'] == 0
+    assert rekap_harian(df.iloc[:0], SLOTS).empty
@@ -0,0 +1,25 @@
+from sesi import LocalRevocations, make_token, read_token
+
+SECRET = "rahasia-bersama"
+
+
+def test_token_roundtrip():
+    username, sig, until = read_token(make_token("budi", SECRET, 60), SECRET)
+    assert username == "budi" and sig and until > 0
+    assert make_token("budi", SECRET, 60) != make_token("budi", SECRET, 60)  # nonce: token hasil rotasi selalu baru
+
+
+def test_token_rejected_when_tampered_expired_or_other_secret():
+    tok = make_token("budi", SECRET, 60)
+    assert read_token(tok[:-2] + ("aa" if not tok.endswith("aa") else "bb"), SECRET) is None
+    assert read_token(make_token("budi", SECRET, -5), SECRET) is None
+    assert read_token(make_token("budi", "secret-lain", 60), SECRET) is None
+    assert read_token("bukan-token", SECRET) is None
+
+
+def test_local_revocations_forget_expired_tokens():
+    rev = LocalRevocations()
+    rev.revoke("lama", 0)
+    rev.revoke("baru", 2 ** 40)
+    assert rev.is_revoked("baru")
+    assert not rev.is_revoked("lama")  # sudah kedaluwarsa: dibuang saat revoke berikutnya
@@ -0,0 +1,168 @@
+import pytest
+import pandas as pd
+from conftest import SLOTS, FakeGSheetsConnection, row, sheet_logs
+from storage import LOG_COLUMNS, BackgroundWriter, ConflictError, GSheetsStorage, log_fields, normalize_logs
+
+
+def two_writers(conn):
+    # Dua proses (worker) berbeda yang menulis ke sheet yang sama
+    return GSheetsStorage(lambda: conn), GSheetsStorage(lambda: conn)
+
+
+def interleave(ws, method, other):
+    # Sekali saja: `other` dijalankan sesudah panggilan ws.<method> berikutnya (batch_update) atau
+    # sebelumnya (append_rows) -> tulisan penulis lain mendarat di antara tulis & verifikasi
+    orig = getattr(ws, method)
+    def hooked(*args, **kwargs):
+        setattr(ws, method, orig)
+        if method == 'append_rows': other(); return orig(*args, **kwargs)
+        res = orig(*args, **kwargs); other(); return res
+    setattr(ws, method, hooked)
+
+
+def live(conn):
+    return normalize_logs(sheet_logs(conn)).set_index('id')
+
+
+def test_update_and_delete_roundtrip(sheet):
+    s = GSheetsStorage(lambda: sheet)
+    assert s.update_log(2, "2030-01-01", "10.00 - 12.00", "rapat ubah", "ok", rev=0)
+    assert s.delete_log(3, rev=0)
+    df = live(sheet)
+    assert sorted(df.index) == [1, 2]
+    assert (df.loc[2, 'aktivitas'], df.loc[2, 'rev']) == ("rapat ubah", 1)
+    with pytest.raises(ConflictError): s.update_log(2, "2030-01-01", "10.00 - 12.00", "basi", "ok", rev=0)
+
+
+def test_update_landing_last_wins_over_delete(sheet):
+    a, b = two_writers(sheet)
+    lay_a, lay_b = a._logs_layout(), b._logs_layout()
+    res_b = []
+    interleave(lay_a.ws, 'batch_update', lambda: res_b.append(
+        b.write_batch([('update', 2, log_fields("2030-01-01", "10.00 - 12.00", "menang", "ok"), 0)], layout=lay_b)))
+    res_a = a.write_batch([('delete', 2, 0)], layout=lay_a)
+    assert res_a.conflicts == {2} and not res_b[0].conflicts
+    df = live(sheet)
+    assert 2 in df.index and df.loc[2, 'aktivitas'] == "menang"  # tidak tertinggal tombstone dari delete yang kalah
+
+
+def test_delete_landing_last_wins_over_update(sheet):
+    a, b = two_writers(sheet)
+    lay_a, lay_b = a._logs_layout(), b._logs_layout()
+    res_b = []
+    interleave(lay_a.ws, 'batch_update', lambda: res_b.append(b.write_batch([('delete', 2, 0)], layout=lay_b)))
+    res_a = a.write_batch([('update', 2, log_fields("2030-01-01", "10.00 - 12.00", "kalah", "ok"), 0)], layout=lay_a)
+    assert res_a.conflicts == {2} and not res_b[0].conflicts
+    assert 2 not in live(sheet).index
+
+
+def test_concurrent_updates_last_writer_wins(sheet):
+    a, b = two_writers(sheet)
+    lay_a, lay_b = a._logs_layout(), b._logs_layout()
+    res_b = []
+    interleave(lay_a.ws, 'batch_update', lambda: res_b.append(
+        b.write_batch([('update', 1, log_fields("2030-01-02", "13.00 - 15.00", "dari b", "b"), 0)], layout=lay_b)))
+    res_a = a.write_batch([('update', 1, log_fields("2030-01-01", "08.00 - 10.00", "dari a", "a"), 0)], layout=lay_a)
+    assert res_a.conflicts == {1} and not res_b[0].conflicts
+    got = live(sheet).loc[1]
+    assert (got['tanggal'], got['waktu'], got['aktivitas'], got['hasil']) == ("2030-01-02", "13.00 - 15.00", "dari b", "b")
+
+
+def test_concurrent_append_gets_distinct_ids(sheet):
+    a, b = two_writers(sheet)
+    lay_a, lay_b = a._logs_layout(), b._logs_layout()
+    rec = lambda text: {"user": "a", **row(aktivitas=text), "id": 4, "rev": 0}
+    res_b = []
+    interleave(lay_a.ws, 'append_rows', lambda: res_b.append(b.write_batch([('insert', 4, rec("b"))], layout=lay_b)))
+    res_a = a.write_batch([('insert', 4, rec("a"))], layout=lay_a)
+    assert res_b[0].remapped == {} and res_a.remapped == {4: 5}  # baris lebih bawah yang mengalah
+    df = live(sheet)
+    assert (df.loc[4, 'aktivitas'], df.loc[5, 'aktivitas']) == ("b", "a")
+
+
+def traffic(conn, fn):
+    # (jumlah request, jumlah sel yang lewat) selama fn() berjalan
+    seen, orig = [], conn._call
+    conn._call = lambda cells=None: (seen.append(sum(len(r) for r in cells or [])), orig(cells))
+    try: fn()
+    finally: del conn._call
+    return len(seen), sum(seen)
+
+
+@pytest.mark.parametrize("n", [10, 5000])
+def test_append_cost_stays_flat(n):
+    conn = FakeGSheetsConnection()
+    conn.load("logs", pd.DataFrame([{"user": "a", **row(), "id": i + 1, "rev": 0} for i in range(n)], columns=LOG_COLUMNS))
+    s = GSheetsStorage(lambda: conn)
+    s.append_logs("a", [row()])  # pertama kali: sekali scan kolom id
+    calls, cells = traffic(conn, lambda: s.append_logs("a", [row(), row()]))
+    assert calls == 2 and cells <= 20  # append_rows + batch_get jendela baris baru, berapa pun ukuran sheet
+    assert sorted(live(conn).index)[-3:] == [n + 1, n + 2, n + 3]
+
+
+def test_append_sees_rows_from_other_process(sheet):
+    a, b = two_writers(sheet)
+    assert a.append_logs("a", [row()]) == [4]
+    assert b.append_logs("a", [row(), row()]) == [5, 6]
+    assert a.append_logs("a", [row()]) == [7]  # id 5-6 milik b terlihat di jendela -> diganti
+    assert b.append_logs("a", [row()]) == [8]
+    assert sorted(live(sheet).index) == list(range(1, 9))
+
+
+def lost_response(ws, method):
+    # Sekali saja: request sampai & dijalankan di server, tetapi balasannya hilang (koneksi putus)
+    orig = getattr(ws, method)
+    def hooked(*args, **kwargs):
+        setattr(ws, method, orig); orig(*args, **kwargs)
+        raise ConnectionError("koneksi putus")
+    setattr(ws, method, hooked)
+
+
+def test_retry_does_not_append_twice(sheet):
+    s = GSheetsStorage(lambda: sheet)
+    s.append_logs("a", [row()])  # id 4
+    lost_response(sheet.sheets["logs"], 'append_rows')
+    ops = [('insert', 5, {"user": "a", **row(aktivitas="sekali"), "id": 5, "rev": 0})]
+    with pytest.raises(ConnectionError): s.write_batch(ops, tag="t1")
+    assert s.write_batch(ops, tag="t1").remapped == {}
+    assert (sheet_logs(sheet)['aktivitas'] == "sekali").sum() == 1
+
+
+def test_retry_after_lost_update_is_not_a_conflict(sheet):
+    s = GSheetsStorage(lambda: sheet)
+    lost_response(sheet.sheets["logs"], 'batch_update')
+    ops = [('update', 1, log_fields("2030-01-01", "08.00 - 10.00", "ubah", "ok"), 0), ('delete', 2, 0)]
+    with pytest.raises(ConnectionError): s.write_batch(ops, tag="t2")
+    res = s.write_batch(ops, tag="t2")
+    assert not res.conflicts and not res.missing
+    df = live(sheet)
+    assert sorted(df.index) == [1, 3] and (df.loc[1, 'aktivitas'], df.loc[1, 'rev']) == ("ubah", 1)
+
+
+def test_writer_retries_failed_batch_per_user(sheet):
+    s = GSheetsStorage(lambda: sheet)
+    w = BackgroundWriter(s, retries=0, linger=0.2)  # dua aksi di bawah masuk satu batch
+    lost_response(sheet.sheets["logs"], 'append_rows')
+    w.submit("a", [('insert', 4, {"user": "a", **row(aktivitas="dari a"), "id": 4, "rev": 0})])
+    w.submit("b", [('insert', 5, {"user": "b", **row(aktivitas="dari b"), "id": 5, "rev": 0})])
+    assert w.flush(10) and len(w.failures()) == 2
+    w.retry_failed("a"); assert w.flush(10)
+    w.retry_failed("b"); assert w.flush(10)  # batch yang sama, dicoba ulang terpisah per user
+    assert not w.failures()
+    assert sheet_logs(sheet)['aktivitas'].tolist().count("dari a") == 1
+    assert sheet_logs(sheet)['aktivitas'].tolist().count("dari b") == 1
+
+
+def test_user_text_is_never_a_formula(sheet):
+    s = GSheetsStorage(lambda: sheet)
+    s.append_logs("a", [row(aktivitas="=HYPERLINK(\"http://x\")", hasil="+62 812")])
+    s.update_log(1, "2030-01-01", SLOTS[0], "=1+1", "@cek", rev=0)
+    s.delete_log(2, rev=0)
+    s.restore_logs(normalize_logs(pd.DataFrame([{"user": "a", **row(aktivitas="=SUM(A:A)"), "id": 2, "rev": 0},
+                                                {"user": "a", **row(aktivitas="-rapat"), "id": 9, "rev": 0}])))
+    got = live(sheet)
+    assert got.loc[4, ['aktivitas', 'hasil']].tolist() == ['=HYPERLINK("http://x")', "+62 812"]
+    assert got.loc[1, ['aktivitas', 'hasil']].tolist() == ["=1+1", "@cek"]
+    assert (got.loc[2, 'aktivitas'], got.loc[9, 'aktivitas']) == ("=SUM(A:A)", "-rapat")
+    s._rewrite_batch({}, {3: log_fields("2030-01-01", SLOTS[2], "=2+2", "ok")}, set(), {})  # fallback tulis ulang sheet
+    assert live(sheet).loc[[1, 3], 'aktivitas'].tolist() == ["=1+1", "=2+2"]
@@ -0,0 +1,64 @@
+import pandas as pd
+from conftest import SLOTS, row
+from storage import make_storage, search_terms, SQLiteStorage, Storage, text_tokens
+
+
+def test_append_and_query(tmp_path):
+    s = SQLiteStorage(str(tmp_path / "k.db"))
+    ids = s.append_logs("a", [row(waktu=w) for w in ("08.00 - 10.00", "10.00 - 12.00")])
+    assert ids == [1, 2]
+    assert s.count_logs("a", "2030-01-01") == 2
+    assert s.slot_mask("a", "2030-01-01", ["08.00 - 10.00", "10.00 - 12.00", "13.00 - 15.00"]) == 0b011
+
+
+def test_write_batch_never_reuses_deleted_id(tmp_path):
+    # Mode async: id dialokasikan dari cache (id tertinggi yang masih hidup). Id yang pernah dihapus
+    # tidak boleh dipakai lagi, supaya restore backup lama (berbasis id) tidak tertukar dengan baris baru.
+    cfg = {"backend": "sqlite", "sqlite_path": str(tmp_path / "k.db"), "async_writes": True}
+    s = make_storage(cfg, None)
+    ids = s.append_logs("a", [row(aktivitas=f"log {i}") for i in range(3)])
+    assert s.writer.flush(10)
+    backup = s.load_logs()
+    s.delete_log(ids[2]); assert s.writer.flush(10)
+
+    s2 = make_storage(cfg, None)  # proses baru: cache hanya melihat id 1-2
+    s2.append_logs("a", [row(aktivitas="baru")])
+    assert s2.writer.flush(10)
+    assert not s2.writer.failures()
+    db = SQLiteStorage(cfg["sqlite_path"]).load_logs()
+    assert db.loc[db['aktivitas'] == 'baru', 'id'].tolist() == [4]
+    assert s2.user_logs("a")['id'].tolist() == [1, 2, 4]  # cache ikut memakai id pengganti
+
+    # Restore backup yang masih memuat baris id 3: masuk lagi, tidak dilewati
+    assert s2.restore_logs(backup) == 1
+    assert sorted(SQLiteStorage(cfg["sqlite_path"]).load_logs()['id']) == [1, 2, 3, 4]
+
+
+def test_restore_skips_existing_ids_and_indexes_new_rows(tmp_path):
+    s = SQLiteStorage(str(tmp_path / "k.db"))
+    s.append_logs("a", [row(aktivitas=f"rapat {i}") for i in range(20)])
+    backup = s.load_logs()
+    assert s.restore_logs(backup) == 0  # upload ulang: tidak ada yang masuk
+    new = backup.tail(2).assign(id=[30, 31], aktivitas=["rapat ulang", "evaluasi anggaran"])
+    assert s.restore_logs(pd.concat([backup, new])) == 2
+    assert s.search_logs("a", "2030-01-01", "2030-01-01", "anggaran")['id'].tolist() == [31]
+    assert len(s.search_logs("a", "2030-01-01", "2030-01-01", "rapat")) == 21
+
+
+def test_search_terms_fold_case_and_diacritics():
+    assert text_tokens("Évaluasi ANGGARAN", None, "rapat_koordinasi, 2030") == ["evaluasi", "anggaran", "rapat", "koordinasi", "2030"]
+    assert search_terms("  Rapat rapat, évaluasi ") == ["rapat", "evaluasi"] and search_terms(None) == []
+
+
+def test_fts_search_matches_prefix_and_all_terms_and_follows_writes(tmp_path):
+    s = SQLiteStorage(str(tmp_path / "k.db"))
+    ids = s.append_logs("a", [row(aktivitas="Rapat koordinasi", hasil="Évaluasi anggaran"), row(aktivitas="rapat mingguan"), row(aktivitas="lain")])
+    s.append_logs("b", [row(aktivitas="rapat")])
+    cari = lambda q: sorted(s.search_logs("a", "2030-01-01", "2030-01-01", q)['id'])
+    assert s._fts and cari("rap") == ids[:2] and cari("RAPAT evalu") == ids[:1] and cari("rapat tidakada") == []
+    assert cari("") == ids  # tanpa kata kunci: semua log pada rentang
+    s.update_log(ids[2], "2030-01-01", SLOTS[0], "rapat evaluasi", "", rev=0)
+    s.delete_log(ids[0])
+    assert cari("evaluasi") == [ids[2]] and cari("koordinasi") == []
+    fallback = Storage.search_logs  # saringan tanpa FTS harus memberi hasil yang sama
+    assert all(sorted(fallback(s, "a", "2030-01-01", "2030-01-01", q)['id']) == cari(q) for q in ("rap", "rapat ev", "ming", "x"))
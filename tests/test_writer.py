@@ -0,0 +1,37 @@
+from conftest import row
+from storage import BackgroundWriter, BatchResult, SQLiteStorage, log_record
+
+
+def insert(user, log_id, **kw):
+    return [('insert', log_id, log_record(user, row(**kw), log_id))]
+
+
+def test_writer_survives_failing_callback(tmp_path):
+    w = BackgroundWriter(SQLiteStorage(str(tmp_path / "k.db")), linger=0)
+    calls = []
+    def on_result(result, users):
+        calls.append(users)
+        if len(calls) == 1: raise RuntimeError("cache rusak")
+    w.on_result = on_result
+    w.submit("a", insert("a", 1))
+    assert w.flush(10)
+    w.submit("a", insert("a", 2))  # thread masih hidup setelah callback pertama gagal
+    assert w.flush(10) and w.pending() == 0 and len(calls) == 2
+    assert w.backend.load_logs()['id'].tolist() == [1, 2]
+
+
+class BrokenBackend:
+    # write_batch mengembalikan nilai tak terduga sekali (bug backend), sesudahnya normal
+    def __init__(self): self.calls = 0
+    def write_batch(self, ops, tag=None):
+        self.calls += 1
+        return None if self.calls == 1 else BatchResult(set(), set(), {})
+
+
+def test_unexpected_error_marks_batch_failed():
+    w = BackgroundWriter(BrokenBackend(), linger=0)
+    w.submit("a", insert("a", 1))
+    assert w.flush(10)
+    assert w.pending() == 0 and [f['user'] for f in w.failures()] == ["a"]
+    w.retry_failed("a")
+    assert w.flush(10) and not w.failures()